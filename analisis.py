@@ -1,3 +1,6 @@
+import io
+import os
+
 import streamlit as st
 import pandas as pd
 import scipy.stats as stats
@@ -5,59 +8,253 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 
+from analisis_calculos import (anova_estadisticos, bootstrap_eta2, bootstrap_v, cajas_grupos,
+                               chi2_tabla, detectar_formato, estadisticos_por_bloques,
+                               histogramas_grupos, huella, leer_columnas, leer_csv,
+                               leer_encabezado, matriz_asociacion, muestra_grupos,
+                               permutacion_anova, permutacion_chi2)
+
+# Archivos locales: solo dentro de este directorio y solo si se configura
+# (cualquier usuario de la página podría leer archivos del servidor)
+DIRECTORIO_DATOS = os.environ.get('ENAHO_DIRECTORIO_DATOS')
+
+# Límites de los gráficos: se dibujan agregados, no los datos completos
+MAX_GRUPOS_CAJAS = 50
+MAX_GRUPOS_HISTOGRAMA = 12
+MUESTRA_KDE = 5000
+
+
+@st.cache_resource(show_spinner='Leyendo archivo...', max_entries=4)
+def cargar_datos(huella_archivo, _origen, encoding, sep):
+    # Cacheado por contenido: los reruns de Streamlit no vuelven a parsear
+    return leer_csv(_origen, huella_archivo, encoding=encoding, sep=sep)
+
+
+@st.cache_resource(show_spinner='Leyendo columnas...', max_entries=16)
+def cargar_columnas(huella_archivo, _origen, columnas, encoding, sep):
+    return leer_columnas(_origen, huella_archivo, columnas, encoding, sep)
+
+
+@st.cache_data(max_entries=16)
+def formato_y_encabezado(huella_archivo, _origen):
+    encoding, sep = detectar_formato(_origen)
+    return encoding, sep, leer_encabezado(_origen, encoding, sep)
+
+
+@st.cache_data(show_spinner='Calculando matriz de asociación...', max_entries=8)
+def calcular_matriz(huella_archivo, columnas, _workers, _df):
+    return matriz_asociacion(_df, _workers)
+
+
+@st.cache_data(show_spinner='Permutando y remuestreando...', max_entries=16)
+def remuestreo_chi2(tabla_contingencia, n_remuestras, _workers):
+    tabla = tabla_contingencia.to_numpy()
+    bajo, alto = bootstrap_v(tabla, n_remuestras, workers=_workers)
+    return permutacion_chi2(tabla, n_remuestras, workers=_workers), chi2_tabla(tabla)[2], bajo, alto
+
+
+@st.cache_data(show_spinner='Permutando y remuestreando...', max_entries=16)
+def remuestreo_anova(huella_archivo, var_grupo, var_numerica, filtrar_outliers, log_transform, welch,
+                     n_remuestras, _df_filtrado, _workers):
+    grupos, valores = _df_filtrado[var_grupo], _df_filtrado[var_numerica]
+    p_valor = permutacion_anova(grupos, valores, n_remuestras, welch=welch, workers=_workers)
+    return (p_valor, *bootstrap_eta2(grupos, valores, n_remuestras, workers=_workers))
+
+
+def figura_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+@st.cache_data(max_entries=16)
+def barras_png(tabla_contingencia, titulo):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    tabla_contingencia.plot(kind='bar', ax=ax)
+    plt.title(titulo)
+    plt.ylabel('Frecuencia')
+    plt.xticks(rotation=45)
+    return figura_png(fig)
+
+
+@st.cache_data(show_spinner='Dibujando gráficos...', max_entries=16)
+def graficos_anova(huella_archivo, var_grupo, var_numerica, filtrar_outliers, log_transform,
+                   _df_filtrado):
+    # Se guardan las imágenes ya renderizadas: los reruns no vuelven a dibujar
+    grupos, valores = _df_filtrado[var_grupo], _df_filtrado[var_numerica]
+    tamanos = grupos.value_counts()
+    tamanos = tamanos[tamanos > 0]
+
+    en_cajas = grupos.isin(tamanos.index[:MAX_GRUPOS_CAJAS])
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bxp(cajas_grupos(grupos[en_cajas], valores[en_cajas]), patch_artist=True,
+           boxprops={'facecolor': 'C0', 'alpha': 0.6}, flierprops={'markersize': 3})
+    plt.title(f'Boxplot de {var_numerica} por {var_grupo}')
+    plt.xlabel(var_grupo)
+    plt.ylabel(var_numerica)
+    plt.xticks(rotation=45)
+    cajas = figura_png(fig)
+
+    # Histogramas en una pasada; la KDE se estima sobre una muestra acotada por grupo
+    en_histograma = grupos.isin(tamanos.index[:MAX_GRUPOS_HISTOGRAMA])
+    bordes, conteos = histogramas_grupos(grupos[en_histograma], valores[en_histograma])
+    muestra = muestra_grupos(grupos[en_histograma], valores[en_histograma], MUESTRA_KDE)
+    muestra = {g: s.to_numpy() for g, s in muestra.groupby(level=0, observed=True)}
+    malla = np.linspace(bordes[0], bordes[-1], 200)
+    fig, ax = plt.subplots()
+    for i, (grupo, fila) in enumerate(conteos.iterrows()):
+        color = f'C{i % 10}'
+        ax.stairs(fila.to_numpy(), bordes, fill=True, alpha=0.4, color=color, label=str(grupo))
+        puntos = muestra.get(grupo, np.empty(0))
+        if len(puntos) > 1 and np.ptp(puntos) > 0:
+            densidad = stats.gaussian_kde(puntos)(malla)
+            ax.plot(malla, densidad * fila.sum() * (bordes[1] - bordes[0]), color=color)
+    plt.xlabel(var_numerica)
+    plt.ylabel('Count')
+    plt.legend()
+    histograma = figura_png(fig)
+    return cajas, histograma, len(tamanos)
+
+
+@st.cache_data(max_entries=8)
+def heatmap_png(matriz_v):
+    lado = max(6, 0.35 * len(matriz_v))
+    fig, ax = plt.subplots(figsize=(lado, lado * 0.8))
+    sns.heatmap(matriz_v, vmin=0, vmax=1, cmap='viridis', square=True, ax=ax,
+                annot=len(matriz_v) <= 15, fmt='.2f')
+    plt.title('V de Cramér entre variables')
+    return figura_png(fig)
+
+
+@st.cache_data(max_entries=32)
+def estadisticos_anova(huella_archivo, var_grupo, var_numerica, filtrar_outliers, log_transform,
+                       _df_filtrado):
+    # Conteo, media y M2 por grupo; el cache depende de las variables y los filtros
+    return estadisticos_por_bloques([_df_filtrado], var_grupo, var_numerica)
+
+
+def huella_subida(archivo):
+    # El hash se calcula una vez por archivo subido, no en cada rerun
+    clave = ('huella', getattr(archivo, 'file_id', None) or (archivo.name, archivo.size))
+    if clave not in st.session_state:
+        st.session_state[clave] = huella(archivo.getvalue())
+    return st.session_state[clave]
+
+
+def ruta_permitida(ruta):
+    """Ruta real del archivo si está dentro de DIRECTORIO_DATOS, si no None"""
+    base = os.path.realpath(DIRECTORIO_DATOS)
+    real = os.path.realpath(os.path.join(base, ruta))
+    if os.path.commonpath([base, real]) != base or not os.path.isfile(real):
+        return None
+    return real
+
+
+def huella_ruta(ruta):
+    # Para archivos locales grandes basta ruta + tamaño + fecha, sin leer todo
+    info = os.stat(ruta)
+    return huella(f'{os.path.abspath(ruta)}|{info.st_size}|{info.st_mtime_ns}'.encode())
+
+
 # Título de la app
 st.title('Análisis Estadístico ENAHO 2022')
 
 # Cargar archivo
 st.sidebar.header('Cargar archivo CSV')
 archivo = st.sidebar.file_uploader('Sube tu archivo CSV', type=['csv'])
+ruta_local = None
+if DIRECTORIO_DATOS:
+    ruta_local = st.sidebar.text_input(f'O escribe la ruta de un archivo en {DIRECTORIO_DATOS} '
+                                       '(archivos grandes)')
 
+origen = None
 if archivo is not None:
-    df = pd.read_csv(archivo, encoding='latin1', sep=',')
+    origen, huella_origen = archivo, huella_subida(archivo)
+elif ruta_local:
+    ruta_real = ruta_permitida(ruta_local)
+    if ruta_real is not None:
+        origen, huella_origen = ruta_real, huella_ruta(ruta_real)
+    else:
+        st.sidebar.error('No se encontró el archivo indicado en el directorio de datos.')
+
+if origen is not None:
+    # Separador y encoding detectados (Book1.csv usa ';')
+    encoding, sep, encabezado = formato_y_encabezado(huella_origen, origen)
+    por_columnas = st.sidebar.checkbox('Cargar solo las columnas seleccionadas',
+                                       value=archivo is None, key='por_columnas')
+
+    st.sidebar.header('Remuestreo')
+    n_remuestras = int(st.sidebar.number_input('Permutaciones / remuestreos bootstrap', 1000, 100_000,
+                                               2000, step=1000, key='n_remuestras'))
+    workers_remuestreo = os.cpu_count() if st.sidebar.checkbox('Usar varios núcleos en el remuestreo',
+                                                               key='remuestreo_nucleos') else 1
+
+    if por_columnas:
+        columnas = list(encabezado.columns)
+        vista_previa = encabezado
+
+        def datos(seleccion):
+            return cargar_columnas(huella_origen, origen, tuple(seleccion), encoding, sep)
+    else:
+        # Marco compartido entre reruns: no modificarlo en el lugar
+        df = cargar_datos(huella_origen, origen, encoding, sep)
+        columnas = list(df.columns)
+        vista_previa = df.head()
+
+        def datos(seleccion):
+            return df[list(dict.fromkeys(seleccion))]
+
     st.write('Datos cargados:')
-    st.write(df.head())
+    st.write(vista_previa)
 
     st.markdown('---')
     st.header('1️⃣ Chi-cuadrado: Asociación entre variables categóricas')
 
-    var_cat1 = st.selectbox('Selecciona la primera variable categórica', df.columns)
-    var_cat2 = st.selectbox('Selecciona la segunda variable categórica', df.columns)
+    var_cat1 = st.selectbox('Selecciona la primera variable categórica', columnas)
+    var_cat2 = st.selectbox('Selecciona la segunda variable categórica', columnas)
 
     if var_cat1 and var_cat2:
         try:
-            tabla_contingencia = pd.crosstab(df[var_cat1], df[var_cat2])
+            df_chi = datos([var_cat1, var_cat2])
+            tabla_contingencia = pd.crosstab(df_chi[var_cat1], df_chi[var_cat2])
             chi2, p, dof, expected = stats.chi2_contingency(tabla_contingencia)
 
             st.write(f'**Chi-cuadrado:** {chi2:.4f}')
             st.write(f'**Valor p:** {p:.4f}')
 
-            fig, ax = plt.subplots(figsize=(10, 6))
-            tabla_contingencia.plot(kind='bar', ax=ax)
-            plt.title(f'Distribución entre {var_cat1} y {var_cat2}')
-            plt.ylabel('Frecuencia')
-            plt.xticks(rotation=45)
-            st.pyplot(fig)
+            if st.checkbox('Valor p por permutación e IC bootstrap de la V de Cramér', key='chi_perm'):
+                p_perm, v, v_bajo, v_alto = remuestreo_chi2(tabla_contingencia, n_remuestras, workers_remuestreo)
+                st.write(f'**Valor p (permutación, {n_remuestras} remuestreos):** {p_perm:.4f}')
+                st.write(f'**V de Cramér:** {v:.4f} (IC 95%: {v_bajo:.4f} – {v_alto:.4f})')
+
+            st.image(barras_png(tabla_contingencia, f'Distribución entre {var_cat1} y {var_cat2}'))
         except Exception as e:
             st.write(f'Error en Chi-cuadrado: {e}')
 
     st.markdown('---')
     st.header('2️⃣ Comparación de medias con ANOVA (3 o más grupos)')
 
-    var_grupo_a = st.selectbox('Selecciona la variable categórica (3 o más grupos)', df.columns, key='anova')
-    var_numerica_a = st.selectbox('Selecciona la variable numérica', df.columns, key='anova_num')
+    var_grupo_a = st.selectbox('Selecciona la variable categórica (3 o más grupos)', columnas, key='anova')
+    var_numerica_a = st.selectbox('Selecciona la variable numérica', columnas, key='anova_num')
 
     if var_grupo_a and var_numerica_a:
-        grupos = df[var_grupo_a].dropna().unique()
+        df_anova = datos([var_grupo_a, var_numerica_a])
+        grupos = df_anova[var_grupo_a].dropna().unique()
         if len(grupos) >= 3:
-            # Conversión segura a numérico
-            df[var_numerica_a] = pd.to_numeric(df[var_numerica_a], errors='coerce')
-            df_filtrado = df[[var_grupo_a, var_numerica_a]].dropna()
+            # Conversión segura a numérico, sin tocar el marco cacheado
+            df_filtrado = pd.DataFrame({
+                var_grupo_a: df_anova[var_grupo_a],
+                # float64: las columnas optimizadas pueden ser int8 y log1p daría float16
+                var_numerica_a: pd.to_numeric(df_anova[var_numerica_a], errors='coerce').astype('float64')
+            }).dropna()
 
             if df_filtrado.empty:
                 st.warning('Los datos filtrados no contienen información válida para el análisis.')
             else:
                 filtrar_outliers = st.checkbox('Filtrar outliers extremos', key='anova_outliers')
                 log_transform = st.checkbox('Aplicar transformación logarítmica', key='anova_log')
+                welch = st.checkbox('Usar ANOVA de Welch (varianzas distintas)', key='anova_welch')
 
                 if filtrar_outliers:
                     q_low = df_filtrado[var_numerica_a].quantile(0.01)
@@ -67,31 +264,71 @@ if archivo is not None:
                 if log_transform:
                     df_filtrado[var_numerica_a] = np.log1p(df_filtrado[var_numerica_a])
 
-                grupos_datos = [df_filtrado[df_filtrado[var_grupo_a] == grupo][var_numerica_a] for grupo in grupos]
+                est = estadisticos_anova(huella_origen, var_grupo_a, var_numerica_a,
+                                         filtrar_outliers, log_transform, df_filtrado)
 
-                # Verificar que cada grupo tenga al menos dos datos distintos
-                grupos_validos = [g for g in grupos_datos if len(g.dropna()) > 1 and np.var(g) > 0]
+                # Solo grupos con al menos dos datos distintos (se decide con los mismos estadísticos)
+                f_stat, p_valor, grupos_validos = anova_estadisticos(est, welch=welch)
 
                 if len(grupos_validos) >= 2:
-                    f_stat, p_valor = stats.f_oneway(*grupos_validos)
-
-                    st.write(f'**ANOVA F:** {f_stat:.4f}')
+                    st.write(f'**ANOVA {"de Welch " if welch else ""}F:** {f_stat:.4f}')
                     st.write(f'**Valor p:** {p_valor:.4f}')
 
-                    fig, ax = plt.subplots(figsize=(10, 6))
-                    sns.boxplot(x=var_grupo_a, y=var_numerica_a, data=df_filtrado, ax=ax)
-                    plt.title(f'Boxplot de {var_numerica_a} por {var_grupo_a}')
-                    plt.xticks(rotation=45)
-                    st.pyplot(fig)
+                    if st.checkbox('Valor p por permutación e IC bootstrap de eta²', key='anova_perm'):
+                        p_perm, eta2, eta2_bajo, eta2_alto = remuestreo_anova(
+                            huella_origen, var_grupo_a, var_numerica_a, filtrar_outliers, log_transform,
+                            welch, n_remuestras, df_filtrado, workers_remuestreo)
+                        st.write(f'**Valor p (permutación, {n_remuestras} remuestreos):** {p_perm:.4f}')
+                        st.write(f'**Eta²:** {eta2:.4f} (IC 95%: {eta2_bajo:.4f} – {eta2_alto:.4f})')
+
+                    cajas, histograma, n_grupos = graficos_anova(huella_origen, var_grupo_a, var_numerica_a,
+                                                                 filtrar_outliers, log_transform, df_filtrado)
+                    st.image(cajas)
+                    if n_grupos > MAX_GRUPOS_CAJAS:
+                        st.caption(f'Se muestran los {MAX_GRUPOS_CAJAS} grupos con más datos de {n_grupos}.')
 
                     st.write('Distribución de los datos por grupo:')
-                    fig, ax = plt.subplots()
-                    for grupo in grupos:
-                        subset = df_filtrado[df_filtrado[var_grupo_a] == grupo]
-                        sns.histplot(subset[var_numerica_a], kde=True, label=str(grupo), ax=ax)
-                    plt.legend()
-                    st.pyplot(fig)
+                    st.image(histograma)
+                    if n_grupos > MAX_GRUPOS_HISTOGRAMA:
+                        st.caption(f'Se muestran los {MAX_GRUPOS_HISTOGRAMA} grupos con más datos de {n_grupos}.')
                 else:
                     st.warning('Los grupos seleccionados no tienen suficiente variabilidad para realizar ANOVA. Por favor, selecciona otras variables.')
         else:
             st.warning('La variable seleccionada debe tener 3 o más grupos diferentes.')
+
+    st.markdown('---')
+    st.header('3️⃣ Matriz de asociación entre variables categóricas')
+
+    sugeridas = [c for c in columnas if not pd.api.types.is_numeric_dtype(encabezado[c])]
+    vars_asociacion = st.multiselect('Variables categóricas a comparar', columnas,
+                                     default=sugeridas[:20], key='asociacion_vars')
+    max_niveles = st.slider('Máximo de niveles por variable', 2, 500, 50, key='asociacion_niveles')
+    varios_nucleos = st.checkbox('Usar varios núcleos', key='asociacion_nucleos')
+
+    if len(vars_asociacion) >= 2 and st.checkbox('Calcular matriz de asociación', key='asociacion'):
+        df_asociacion = datos(vars_asociacion)
+        niveles = df_asociacion.nunique()
+        excluidas = list(niveles[niveles > max_niveles].index)
+        if excluidas:
+            st.info(f'Se omiten por tener más de {max_niveles} niveles: {", ".join(map(str, excluidas))}')
+        incluidas = [c for c in vars_asociacion if c not in excluidas]
+
+        if len(incluidas) >= 2:
+            matrices = calcular_matriz(huella_origen, tuple(incluidas),
+                                       os.cpu_count() if varios_nucleos else 1,
+                                       df_asociacion[incluidas])
+            st.image(heatmap_png(matrices['v']), caption='V de Cramér')
+
+            # Cada pareja una sola vez (triángulo superior)
+            i, j = np.triu_indices(len(incluidas), 1)
+            pares = pd.DataFrame({
+                'variable 1': np.array(incluidas, dtype=object)[i],
+                'variable 2': np.array(incluidas, dtype=object)[j],
+                'chi2': matrices['chi2'].to_numpy()[i, j],
+                'valor_p': matrices['p'].to_numpy()[i, j],
+                'v_cramer': matrices['v'].to_numpy()[i, j]
+            })
+            st.write('Parejas ordenadas por V de Cramér:')
+            st.dataframe(pares.sort_values('v_cramer', ascending=False))
+        else:
+            st.warning('Se necesitan al menos dos variables dentro del límite de niveles.')
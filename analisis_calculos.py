@@ -0,0 +1,625 @@
+"""Cálculos de apoyo para analisis.py: lectura de datos y estadísticos.
+
+Sin dependencias de Streamlit, para poder reutilizarse desde procesos
+hijos y desde scripts.
+"""
+import codecs
+import csv
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import scipy.stats as stats
+
+# Columnas de texto con menos de esta fracción de valores distintos pasan a categoría
+FRACCION_CATEGORICA = 0.5
+
+DIRECTORIO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_enaho')
+
+# Filas por bloque al leer columnas de archivos grandes
+TAM_BLOQUE = 500_000
+
+try:
+    import pyarrow  # noqa: F401  (solo para decidir el formato del cache)
+    FORMATO_CACHE = 'parquet'
+except ImportError:
+    FORMATO_CACHE = 'pickle'
+
+
+def huella(contenido):
+    """Hash del contenido de un archivo (bytes o archivo abierto en modo binario)"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(contenido, (bytes, bytearray, memoryview)):
+        h.update(contenido)
+    else:
+        contenido.seek(0)
+        while bloque := contenido.read(1 << 24):
+            h.update(bloque)
+        contenido.seek(0)
+    return h.hexdigest()
+
+
+def optimizar_tipos(df):
+    """Texto repetitivo a categoría y números al tipo más chico sin perder valores"""
+    for columna in df.columns:
+        serie = df[columna]
+        if serie.dtype == object:
+            # Columnas mezcladas (números y texto, típico con DtypeWarning): todo a texto,
+            # si no Parquet no puede guardarlas
+            serie = df[columna] = serie.astype('string')
+        if pd.api.types.is_string_dtype(serie.dtype):
+            if serie.nunique(dropna=True) < FRACCION_CATEGORICA * len(serie):
+                df[columna] = serie.astype('category')
+        elif pd.api.types.is_integer_dtype(serie.dtype):
+            df[columna] = pd.to_numeric(serie, downcast='integer')
+        elif pd.api.types.is_float_dtype(serie.dtype):
+            reducida = serie.astype(np.float32)
+            # Solo si float32 representa exactamente los mismos valores
+            if np.array_equal(reducida.to_numpy(np.float64), serie.to_numpy(), equal_nan=True):
+                df[columna] = reducida
+    return df
+
+
+def leer_csv(archivo, huella_archivo, encoding='latin1', sep=','):
+    """Lee un CSV con tipos optimizados, usando una copia Parquet si ya existe"""
+    ruta_parquet = os.path.join(DIRECTORIO_CACHE, f'{huella_archivo}.parquet')
+    if os.path.exists(ruta_parquet):
+        return pd.read_parquet(ruta_parquet)
+
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    df = optimizar_tipos(pd.read_csv(archivo, encoding=encoding, sep=sep))
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        df.to_parquet(ruta_parquet + '.tmp')
+        os.replace(ruta_parquet + '.tmp', ruta_parquet)
+    except (ImportError, ValueError, TypeError):
+        # Sin pyarrow/fastparquet, o con una columna que Parquet no acepta:
+        # solo queda el cache en memoria
+        if os.path.exists(ruta_parquet + '.tmp'):
+            os.remove(ruta_parquet + '.tmp')
+    return df
+
+
+def _rebobinar(origen):
+    if hasattr(origen, 'seek'):
+        origen.seek(0)
+
+
+def detectar_formato(origen, tam_muestra=1 << 16):
+    """Detecta (encoding, separador) a partir del comienzo del archivo"""
+    _rebobinar(origen)
+    if hasattr(origen, 'read'):
+        muestra = origen.read(tam_muestra)
+        _rebobinar(origen)
+    else:
+        with open(origen, 'rb') as f:
+            muestra = f.read(tam_muestra)
+
+    # El decodificador incremental tolera un carácter cortado al final de la muestra
+    try:
+        texto = codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+        encoding = 'utf-8'
+    except UnicodeDecodeError:
+        texto = muestra.decode('latin1')
+        encoding = 'latin1'
+
+    lineas = texto.splitlines()
+    if len(muestra) == tam_muestra and len(lineas) > 1:
+        lineas = lineas[:-1]  # la última línea puede estar incompleta
+    try:
+        sep = csv.Sniffer().sniff('\n'.join(lineas[:50]), delimiters=',;\t|').delimiter
+    except csv.Error:
+        sep = ','
+    return encoding, sep
+
+
+def leer_encabezado(origen, encoding, sep, filas=5):
+    """Primeras filas del archivo, sin leer el resto (nombres de columnas y vista previa)"""
+    _rebobinar(origen)
+    return pd.read_csv(origen, encoding=encoding, sep=sep, nrows=filas)
+
+
+def _ruta_columna(huella_archivo, columna):
+    nombre = hashlib.blake2b(str(columna).encode(), digest_size=8).hexdigest()
+    return os.path.join(DIRECTORIO_CACHE, huella_archivo, f'{nombre}.{FORMATO_CACHE}')
+
+
+def _guardar(df, ruta):
+    temporal = ruta + '.tmp'
+    if FORMATO_CACHE == 'parquet':
+        df.to_parquet(temporal)
+    else:
+        df.to_pickle(temporal)
+    os.replace(temporal, ruta)
+
+
+def _cargar(ruta, columnas=None):
+    if FORMATO_CACHE == 'parquet':
+        return pd.read_parquet(ruta, columns=columnas)
+    df = pd.read_pickle(ruta)
+    return df if columnas is None else df[columnas]
+
+
+def _unir_partes(partes, columna):
+    """Arma una columna leyendo de disco las partes ya optimizadas, de a una.
+
+    `partes` es una lista de (ruta, filas, tipos). Números y categorías se copian
+    a un arreglo del tamaño final, así la memoria es la columna final más una parte.
+    """
+    tipos = [tipos_parte[columna] for _, _, tipos_parte in partes]
+    total = sum(filas for _, filas, _ in partes)
+
+    if all(isinstance(tipo, pd.CategoricalDtype) for tipo in tipos):
+        categorias = union_categoricals([pd.Categorical([], dtype=tipo) for tipo in tipos]).categories
+        codigos = np.empty(total, dtype=np.min_scalar_type(-len(categorias)))
+        inicio = 0
+        for ruta, filas, _ in partes:
+            valores = _cargar(ruta, [columna])[columna]
+            codigos[inicio:inicio + filas] = pd.Categorical(valores, categories=categorias).codes
+            inicio += filas
+        return pd.Series(pd.Categorical.from_codes(codigos, dtype=pd.CategoricalDtype(categorias)),
+                         name=columna)
+
+    if all(isinstance(tipo, np.dtype) and tipo.kind in 'biuf' for tipo in tipos):
+        # result_type no pierde valores: int8 con float32 da float32, int32 con float32 da float64
+        valores = np.empty(total, dtype=np.result_type(*tipos))
+        inicio = 0
+        for ruta, filas, _ in partes:
+            valores[inicio:inicio + filas] = _cargar(ruta, [columna])[columna].to_numpy()
+            inicio += filas
+        return pd.Series(valores, name=columna)
+
+    # Texto en alguna parte (números en otras, o categoría solo en algunas): todas las
+    # piezas pasan al mismo tipo texto, se unen y se vuelve a evaluar la columna entera
+    piezas = []
+    for ruta, _, _ in partes:
+        pieza = _cargar(ruta, [columna])[columna]
+        if isinstance(pieza.dtype, pd.CategoricalDtype):
+            pieza = pieza.astype(pieza.cat.categories.dtype)
+        piezas.append(pieza.astype('string'))
+    return optimizar_tipos(pd.concat(piezas, ignore_index=True).to_frame())[columna]
+
+
+def leer_columnas(origen, huella_archivo, columnas, encoding, sep, tam_bloque=TAM_BLOQUE):
+    """Carga solo `columnas`, por bloques, pasando por un cache columnar en disco"""
+    columnas = list(dict.fromkeys(columnas))
+    rutas = {c: _ruta_columna(huella_archivo, c) for c in columnas}
+    faltantes = [c for c in columnas if not os.path.exists(rutas[c])]
+
+    leidas = {}
+    if faltantes:
+        directorio = os.path.dirname(rutas[faltantes[0]])
+        os.makedirs(directorio, exist_ok=True)
+        temporal = tempfile.mkdtemp(prefix='partes_', dir=directorio)
+        try:
+            # Cada bloque se optimiza y se baja a disco al leerlo: en memoria hay un
+            # solo bloque sin comprimir, nunca todas las filas a la vez
+            _rebobinar(origen)
+            partes = []
+            for i, bloque in enumerate(pd.read_csv(origen, encoding=encoding, sep=sep,
+                                                   usecols=faltantes, chunksize=tam_bloque)):
+                bloque = optimizar_tipos(bloque.reset_index(drop=True))
+                ruta = os.path.join(temporal, f'{i}.{FORMATO_CACHE}')
+                _guardar(bloque, ruta)
+                partes.append((ruta, len(bloque), bloque.dtypes.to_dict()))
+                del bloque
+            if not partes:
+                _rebobinar(origen)
+                vacio = pd.read_csv(origen, encoding=encoding, sep=sep, usecols=faltantes, nrows=0)
+                ruta = os.path.join(temporal, f'0.{FORMATO_CACHE}')
+                _guardar(vacio, ruta)
+                partes.append((ruta, 0, vacio.dtypes.to_dict()))
+
+            for c in faltantes:
+                leidas[c] = _unir_partes(partes, c).to_frame()
+                _guardar(leidas[c], rutas[c])
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+
+    for c in columnas:
+        if c not in leidas:
+            leidas[c] = _cargar(rutas[c])
+    return pd.concat([leidas[c] for c in columnas], axis=1)
+
+
+def codificar(serie):
+    """Códigos enteros por nivel y cantidad de niveles; los faltantes usan el código extra"""
+    codigos, niveles = pd.factorize(serie, use_na_sentinel=True)
+    codigos = codigos.astype(np.int32)
+    codigos[codigos < 0] = len(niveles)
+    return codigos, len(niveles)
+
+
+def chi2_tabla(tabla, correccion=True):
+    """Chi-cuadrado, grados de libertad y V de Cramér de una tabla de conteos.
+
+    Igual que stats.chi2_contingency (incluida la corrección de Yates con 1 g.l.),
+    ignorando filas y columnas vacías como hace pd.crosstab. El valor p se obtiene
+    aparte con stats.chi2.sf, vectorizado cuando hay muchas tablas.
+    """
+    tabla = tabla[tabla.sum(axis=1) > 0][:, tabla.sum(axis=0) > 0]
+    n = tabla.sum()
+    filas, columnas = tabla.shape
+    dof = (filas - 1) * (columnas - 1)
+    if dof <= 0:
+        return 0.0, max(dof, 0), 0.0
+
+    esperado = np.outer(tabla.sum(axis=1), tabla.sum(axis=0)) / n
+    chi2_simple = float(((tabla - esperado) ** 2 / esperado).sum())
+    chi2 = chi2_simple
+    if correccion and dof == 1:
+        diferencia = esperado - tabla
+        ajustada = tabla + np.sign(diferencia) * np.minimum(0.5, np.abs(diferencia))
+        chi2 = float(((ajustada - esperado) ** 2 / esperado).sum())
+    return chi2, dof, float(np.sqrt(chi2_simple / (n * (min(filas, columnas) - 1))))
+
+
+# Códigos compartidos con los procesos hijos (se copian una vez por proceso)
+_codigos_globales = None
+
+
+def _iniciar_proceso(codigos, niveles):
+    global _codigos_globales
+    _codigos_globales = (codigos, niveles)
+
+
+def _asociaciones_fila(i, codigos=None, niveles=None, max_elementos=1 << 24):
+    """Todas las parejas (i, j>i) con un bincount por grupo de columnas j"""
+    if codigos is None:
+        codigos, niveles = _codigos_globales
+    # Una fila/columna extra por tabla para los faltantes, que luego se descarta
+    a, na = codigos[i], niveles[i] + 1
+    resultados = []
+    paso = max(1, max_elementos // max(len(a), 1))
+    for inicio in range(i + 1, len(codigos), paso):
+        fin = min(inicio + paso, len(codigos))
+        js = np.arange(inicio, fin)
+        nbs = niveles[js] + 1
+        tamanos = na * nbs
+        desplazamientos = np.concatenate(([0], np.cumsum(tamanos)[:-1]))
+        # Índice de celda de cada fila en su tabla, todas las tablas en un solo arreglo
+        indice = nbs[:, None] * a[None, :]
+        indice += desplazamientos[:, None]
+        indice += codigos[inicio:fin]
+        conteos = np.bincount(indice.ravel(), minlength=int(tamanos.sum()))
+        for j, desde, tamano, nb in zip(js, desplazamientos, tamanos, nbs):
+            tabla = conteos[desde:desde + tamano].reshape(na, nb)[:-1, :-1]
+            resultados.append((i, int(j), *chi2_tabla(tabla)))
+    return resultados
+
+
+def matriz_asociacion(df, workers=1):
+    """Chi-cuadrado, valor p y V de Cramér para todas las parejas de columnas de df"""
+    columnas = list(df.columns)
+    k = len(columnas)
+    codificadas = [codificar(df[c]) for c in columnas]
+    codigos = np.stack([c for c, _ in codificadas]) if codificadas else np.zeros((0, len(df)), np.int32)
+    niveles = np.array([n for _, n in codificadas], dtype=np.int64)
+
+    filas = range(k - 1)
+    if workers > 1 and k > 2:
+        # 'spawn': un fork del proceso de Streamlit, con hilos, puede heredar bloqueos tomados
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_proceso,
+                                 initargs=(codigos, niveles),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            partes = list(pool.map(_asociaciones_fila, filas))
+    else:
+        partes = [_asociaciones_fila(i, codigos, niveles) for i in filas]
+
+    pares = np.array([fila for parte in partes for fila in parte], dtype=float).reshape(-1, 5)
+    i, j = pares[:, 0].astype(int), pares[:, 1].astype(int)
+    salida = {}
+    for nombre, valores in (('chi2', pares[:, 2]), ('p', stats.chi2.sf(pares[:, 2], pares[:, 3])),
+                            ('v', pares[:, 4])):
+        matriz = np.full((k, k), np.nan)
+        matriz[i, j] = matriz[j, i] = valores
+        if nombre == 'v':
+            np.fill_diagonal(matriz, 1.0)
+        salida[nombre] = pd.DataFrame(matriz, index=columnas, columns=columnas)
+    return salida
+
+
+def estadisticos_grupos(grupos, valores):
+    """Conteo, media y M2 (suma de cuadrados centrada) por grupo, con un solo groupby"""
+    agrupado = pd.Series(valores).groupby(pd.Series(grupos), observed=True, sort=True)
+    n = agrupado.count()
+    media = agrupado.mean()
+    m2 = agrupado.var(ddof=0) * n
+    est = pd.DataFrame({'n': n.astype(np.int64), 'media': media, 'm2': m2.fillna(0.0)})
+    return est[est['n'] > 0]
+
+
+def combinar_estadisticos(a, b):
+    """Une los estadísticos de dos bloques (Chan et al.), alineando por grupo"""
+    a, b = a.align(b, fill_value=0)
+    n = a['n'] + b['n']
+    delta = b['media'] - a['media']
+    peso = (b['n'] / n).fillna(0.0)
+    return pd.DataFrame({
+        'n': n.astype(np.int64),
+        'media': a['media'] + delta * peso,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * peso,
+    })
+
+
+def estadisticos_por_bloques(bloques, var_grupo, var_numerica):
+    """Estadísticos por grupo acumulados sobre un iterable de DataFrames (lectura por bloques)"""
+    total = None
+    for bloque in bloques:
+        est = estadisticos_grupos(bloque[var_grupo], pd.to_numeric(bloque[var_numerica], errors='coerce'))
+        total = est if total is None else combinar_estadisticos(total, est)
+    return total
+
+
+def anova_estadisticos(est, welch=False):
+    """F, valor p y grupos usados de un ANOVA de una vía a partir de (n, media, m2).
+
+    Solo entran los grupos con dos datos o más y varianza positiva, igual que el
+    filtro previo a stats.f_oneway. Con welch=True se usa el ANOVA de Welch,
+    que no supone varianzas iguales.
+    """
+    validos = est[(est['n'] > 1) & (est['m2'] > 0)]
+    k = len(validos)
+    if k < 2:
+        return np.nan, np.nan, validos
+    n, media, m2 = (validos[c].to_numpy(dtype=float) for c in ('n', 'media', 'm2'))
+
+    if welch:
+        w = n * (n - 1) / m2
+        media_w = (w * media).sum() / w.sum()
+        a = (w * (media - media_w) ** 2).sum() / (k - 1)
+        termino = ((1 - w / w.sum()) ** 2 / (n - 1)).sum()
+        f = a / (1 + 2 * (k - 2) / (k ** 2 - 1) * termino)
+        dof2 = (k ** 2 - 1) / (3 * termino)
+    else:
+        total = n.sum()
+        media_total = (n * media).sum() / total
+        entre = (n * (media - media_total) ** 2).sum()
+        f = (entre / (k - 1)) / (m2.sum() / (total - k))
+        dof2 = total - k
+    return float(f), float(stats.f.sf(f, k - 1, dof2)), validos
+
+
+def histogramas_grupos(grupos, valores, bins=50):
+    """Histogramas por grupo con bordes comunes, en una sola pasada de bincount"""
+    valores = np.asarray(valores, dtype=float)
+    bordes = np.histogram_bin_edges(valores, bins=bins)
+    codigos, niveles = pd.factorize(pd.Series(grupos), sort=True)
+    # El último borde es cerrado, como en np.histogram
+    cajas = np.clip(np.searchsorted(bordes, valores, side='right') - 1, 0, len(bordes) - 2)
+    conteos = np.bincount(codigos * (len(bordes) - 1) + cajas,
+                          minlength=len(niveles) * (len(bordes) - 1))
+    return bordes, pd.DataFrame(conteos.reshape(len(niveles), -1), index=niveles)
+
+
+def muestra_grupos(grupos, valores, max_por_grupo=2000, seed=0):
+    """Hasta max_por_grupo valores al azar de cada grupo (para KDE y puntos atípicos)"""
+    serie = pd.Series(np.asarray(valores, dtype=float), index=pd.Series(grupos).to_numpy())
+    orden = np.random.default_rng(seed).permutation(len(serie))
+    mezclada = serie.iloc[orden]
+    posicion = mezclada.groupby(level=0, observed=True).cumcount()
+    return mezclada[posicion.to_numpy() < max_por_grupo]
+
+
+def cajas_grupos(grupos, valores, max_atipicos=100, seed=0):
+    """Estadísticos de ax.bxp por grupo: cuartiles, bigotes (1.5 RIC) y una muestra de atípicos"""
+    valores = pd.Series(np.asarray(valores, dtype=float))
+    grupos = pd.Series(pd.Series(grupos).to_numpy())
+    cuartiles = valores.groupby(grupos, observed=True).quantile([0.25, 0.5, 0.75]).unstack()
+    ric = cuartiles[0.75] - cuartiles[0.25]
+    bajo = (cuartiles[0.25] - 1.5 * ric).reindex(grupos).to_numpy()
+    alto = (cuartiles[0.75] + 1.5 * ric).reindex(grupos).to_numpy()
+
+    dentro = (valores.to_numpy() >= bajo) & (valores.to_numpy() <= alto)
+    bigotes = valores[dentro].groupby(grupos[dentro], observed=True).agg(['min', 'max'])
+    atipicos = muestra_grupos(grupos[~dentro], valores[~dentro], max_atipicos, seed)
+    atipicos = {g: s.to_numpy() for g, s in atipicos.groupby(level=0, observed=True)}
+
+    cajas = []
+    for grupo, fila in cuartiles.iterrows():
+        cajas.append({
+            'label': str(grupo), 'q1': fila[0.25], 'med': fila[0.5], 'q3': fila[0.75],
+            'whislo': bigotes['min'].get(grupo, fila[0.25]),
+            'whishi': bigotes['max'].get(grupo, fila[0.75]),
+            'fliers': atipicos.get(grupo, np.empty(0)),
+        })
+    return cajas
+
+
+# Elementos por lote de remuestreo (acota la memoria de cada bloque vectorizado)
+MAX_ELEMENTOS_LOTE = 1 << 23
+
+# Función y datos del remuestreo en curso, compartidos con los procesos hijos
+_remuestreo_global = None
+
+
+def _iniciar_remuestreo(funcion, datos):
+    global _remuestreo_global
+    _remuestreo_global = (funcion, datos)
+
+
+def _lote_remuestreo(args):
+    tamano, semilla = args
+    funcion, datos = _remuestreo_global
+    return funcion(*datos, tamano, np.random.default_rng(semilla))
+
+
+def remuestrear(funcion, datos, total, lote, seed=0, workers=1):
+    """Aplica funcion(*datos, tamano, rng) por lotes y concatena los estadísticos.
+
+    Cada lote tiene su propia semilla derivada de `seed`, así el resultado no
+    depende del número de procesos.
+    """
+    tamanos = [min(lote, total - inicio) for inicio in range(0, total, lote)]
+    semillas = np.random.SeedSequence(seed).spawn(len(tamanos))
+    if workers > 1 and len(tamanos) > 1:
+        # 'spawn' como en matriz_asociacion: funcion debe ser de nivel de módulo
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_remuestreo,
+                                 initargs=(funcion, datos),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            partes = list(pool.map(_lote_remuestreo, zip(tamanos, semillas)))
+    else:
+        partes = [funcion(*datos, t, np.random.default_rng(s)) for t, s in zip(tamanos, semillas)]
+    return np.concatenate(partes) if partes else np.empty(0)
+
+
+def _valor_p(observado, simulados):
+    """Valor p de Monte Carlo (con el observado incluido, nunca es 0)"""
+    return float((1 + np.sum(simulados >= observado * (1 - 1e-12))) / (len(simulados) + 1))
+
+
+def _chi2_tablas(tablas):
+    """Chi-cuadrado de Pearson de un lote de tablas (lote, filas, columnas)"""
+    n = tablas.sum(axis=(1, 2)).astype(float)
+    filas = tablas.sum(axis=2).astype(float)
+    columnas = tablas.sum(axis=1).astype(float)
+    esperado = filas[:, :, None] * columnas[:, None, :] / n[:, None, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.where(esperado > 0, tablas ** 2 / esperado, 0.0).sum(axis=(1, 2)) - n
+    return chi2, n, filas, columnas
+
+
+def _tablas_permutadas(filas, columnas, tamano, rng):
+    """Chi-cuadrado de `tamano` tablas con los márgenes fijos (permutación de etiquetas).
+
+    Permutar una columna deja la tabla con distribución hipergeométrica
+    multivariante; se muestrea celda a celda, vectorizado sobre el lote, con
+    un costo que no depende del número de filas de los datos.
+    """
+    tablas = np.zeros((tamano, len(filas), len(columnas)), dtype=np.int64)
+    restantes = np.tile(columnas, (tamano, 1))
+    for i, total_fila in enumerate(filas[:-1]):
+        por_repartir = np.full(tamano, total_fila, dtype=np.int64)
+        resto = np.cumsum(restantes[:, ::-1], axis=1)[:, ::-1]
+        for j in range(len(columnas) - 1):
+            x = rng.hypergeometric(restantes[:, j], resto[:, j + 1], por_repartir)
+            tablas[:, i, j] = x
+            por_repartir -= x
+        tablas[:, i, -1] = por_repartir
+        restantes -= tablas[:, i]
+    tablas[:, -1] = restantes
+    return _chi2_tablas(tablas)[0]
+
+
+def permutacion_chi2(tabla, n_permutaciones=10_000, seed=0, workers=1):
+    """Valor p por permutación del chi-cuadrado de Pearson de una tabla de conteos"""
+    tabla = np.asarray(tabla, dtype=np.int64)
+    tabla = tabla[tabla.sum(axis=1) > 0][:, tabla.sum(axis=0) > 0]
+    if min(tabla.shape) < 2:
+        return 1.0
+    observado = _chi2_tablas(tabla[None])[0][0]
+    lote = max(1, MAX_ELEMENTOS_LOTE // tabla.size)
+    simulados = remuestrear(_tablas_permutadas, (tabla.sum(axis=1), tabla.sum(axis=0)),
+                            n_permutaciones, lote, seed, workers)
+    return _valor_p(observado, simulados)
+
+
+def _v_remuestreadas(probabilidades, n, forma, tamano, rng):
+    tablas = rng.multinomial(n, probabilidades, size=tamano).reshape(tamano, *forma)
+    chi2, n, filas, columnas = _chi2_tablas(tablas)
+    k = np.minimum((filas > 0).sum(axis=1), (columnas > 0).sum(axis=1)) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(k > 0, np.sqrt(np.maximum(chi2, 0) / (n * k)), 0.0)
+
+
+def bootstrap_v(tabla, n_remuestras=10_000, nivel=0.95, seed=0, workers=1):
+    """Intervalo bootstrap (percentil) de la V de Cramér, remuestreando la tabla multinomialmente"""
+    tabla = np.asarray(tabla, dtype=np.int64)
+    n = int(tabla.sum())
+    lote = max(1, MAX_ELEMENTOS_LOTE // tabla.size)
+    valores = remuestrear(_v_remuestreadas, ((tabla / n).ravel(), n, tabla.shape),
+                          n_remuestras, lote, seed, workers)
+    alfa = (1 - nivel) / 2
+    return tuple(float(q) for q in np.quantile(valores, [alfa, 1 - alfa]))
+
+
+def _preparar_grupos(grupos, valores):
+    """Valores centrados y ordenados por grupo, solo de grupos válidos para ANOVA"""
+    serie = pd.Series(np.asarray(valores, dtype=float), index=pd.Series(grupos).to_numpy()).dropna()
+    serie = serie[serie.index.notna()]
+    validos = estadisticos_grupos(serie.index, serie.to_numpy())
+    validos = validos[(validos['n'] > 1) & (validos['m2'] > 0)]
+    serie = serie[serie.index.isin(validos.index)]
+    codigos, _ = pd.factorize(serie.index, sort=True)
+    orden = np.argsort(codigos, kind='stable')
+    x = serie.to_numpy()[orden]
+    tamanos = np.bincount(codigos)
+    return x - x.mean(), tamanos
+
+
+def _f_sumas(sumas, cuadrados, tamanos, welch):
+    """F (clásico o de Welch) por fila a partir de sumas y sumas de cuadrados por grupo"""
+    k = tamanos.shape[-1]
+    medias = sumas / tamanos
+    m2 = cuadrados - sumas * medias
+    if welch:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = tamanos * (tamanos - 1) / m2
+            media_w = (w * medias).sum(axis=-1, keepdims=True) / w.sum(axis=-1, keepdims=True)
+            a = (w * (medias - media_w) ** 2).sum(axis=-1) / (k - 1)
+            termino = ((1 - w / w.sum(axis=-1, keepdims=True)) ** 2 / (tamanos - 1)).sum(axis=-1)
+            return a / (1 + 2 * (k - 2) / (k ** 2 - 1) * termino)
+    total = tamanos.sum()
+    entre = (sumas ** 2 / tamanos).sum(axis=-1) - sumas.sum(axis=-1) ** 2 / total
+    return (entre / (k - 1)) / (m2.sum(axis=-1) / (total - k))
+
+
+def _f_permutadas(x, tamanos, welch, tamano, rng):
+    inicios = np.concatenate(([0], np.cumsum(tamanos)[:-1]))
+    permutados = rng.permuted(np.broadcast_to(x, (tamano, len(x))), axis=1)
+    sumas = np.add.reduceat(permutados, inicios, axis=1)
+    np.square(permutados, out=permutados)
+    cuadrados = np.add.reduceat(permutados, inicios, axis=1)
+    return _f_sumas(sumas, cuadrados, tamanos, welch)
+
+
+def permutacion_anova(grupos, valores, n_permutaciones=10_000, welch=False, seed=0, workers=1):
+    """Valor p por permutación del F de ANOVA (o de Welch), permutando las etiquetas de grupo"""
+    x, tamanos = _preparar_grupos(grupos, valores)
+    if len(tamanos) < 2:
+        return np.nan
+    inicios = np.concatenate(([0], np.cumsum(tamanos)[:-1]))
+    observado = _f_sumas(np.add.reduceat(x, inicios), np.add.reduceat(x ** 2, inicios), tamanos, welch)
+    lote = max(1, MAX_ELEMENTOS_LOTE // len(x))
+    simulados = remuestrear(_f_permutadas, (x, tamanos, welch), n_permutaciones, lote, seed, workers)
+    return _valor_p(observado, simulados)
+
+
+def _eta2_remuestreadas(x, tamanos, tamano, rng):
+    # Remuestreo estratificado: cada grupo conserva su tamaño
+    inicios = np.concatenate(([0], np.cumsum(tamanos)[:-1]))
+    sumas = np.empty((tamano, len(tamanos)))
+    cuadrados = np.empty((tamano, len(tamanos)))
+    for g, (inicio, n) in enumerate(zip(inicios, tamanos)):
+        muestra = x[inicio:inicio + n][rng.integers(0, n, size=(tamano, n), dtype=np.int32)]
+        sumas[:, g] = muestra.sum(axis=1)
+        cuadrados[:, g] = np.square(muestra, out=muestra).sum(axis=1)
+    return _eta2_sumas(sumas, cuadrados, tamanos)
+
+
+def _eta2_sumas(sumas, cuadrados, tamanos):
+    total = tamanos.sum()
+    total_ss = cuadrados.sum(axis=-1) - sumas.sum(axis=-1) ** 2 / total
+    entre = (sumas ** 2 / tamanos).sum(axis=-1) - sumas.sum(axis=-1) ** 2 / total
+    return entre / total_ss
+
+
+def bootstrap_eta2(grupos, valores, n_remuestras=10_000, nivel=0.95, seed=0, workers=1):
+    """Eta cuadrado y su intervalo bootstrap (percentil) con remuestreo estratificado por grupo"""
+    x, tamanos = _preparar_grupos(grupos, valores)
+    if len(tamanos) < 2:
+        return np.nan, np.nan, np.nan
+    inicios = np.concatenate(([0], np.cumsum(tamanos)[:-1]))
+    eta2 = float(_eta2_sumas(np.add.reduceat(x, inicios), np.add.reduceat(x ** 2, inicios), tamanos))
+    lote = max(1, MAX_ELEMENTOS_LOTE // len(x))
+    valores = remuestrear(_eta2_remuestreadas, (x, tamanos), n_remuestras, lote, seed, workers)
+    alfa = (1 - nivel) / 2
+    bajo, alto = np.quantile(valores, [alfa, 1 - alfa])
+    return eta2, float(bajo), float(alto)
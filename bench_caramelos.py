@@ -0,0 +1,136 @@
+"""Benchmarks del simulador con semillas fijas: tiempo, throughput y memoria pico.
+
+Uso:
+    python bench_caramelos.py                    # compara contra bench_caramelos.json
+    python bench_caramelos.py --guardar          # reescribe la línea base
+    python bench_caramelos.py --rapido --umbral 0.5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from caramelos import CarameloSimulator, app
+
+SEMILLA = 2024
+ARCHIVO_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_caramelos.json')
+
+JUGADORES = [30, 1_000, 100_000, 1_000_000]
+SIMULACIONES = [100, 1_000, 10_000, 100_000]
+# Sin seed: con semilla las rutas responden desde el cache de resultados
+RUTAS = [
+    '/api/fase1?jugadores=30',
+    '/api/fase2?jugadores=30',
+    '/api/fase2/exacta?jugadores=30',
+    '/api/estadisticas?simulaciones=1000',
+    '/api/estadisticas/stream?simulaciones=1000',
+    '/api/barrido?jugadores=10,100,1000&por_equipo=5,15&simulaciones=100',
+]
+
+
+def casos(rapido=False):
+    """Genera (nombre, unidades, preparar, medir); preparar no se cronometra"""
+    sim = CarameloSimulator()
+    jugadores = JUGADORES[:-1] if rapido else JUGADORES
+    simulaciones = SIMULACIONES[:-1] if rapido else SIMULACIONES
+
+    for n in jugadores:
+        yield (f'generar_caramelos[{n}]', 2 * n, lambda: None,
+               lambda _, n=n: sim.generar_caramelos(2 * n, np.random.default_rng(SEMILLA)))
+        yield (f'crear_jugadores[{n}]', n, lambda: None,
+               lambda _, n=n: sim.crear_jugadores(n, np.random.default_rng(SEMILLA)))
+        yield (f'crear_equipos[{n}]', n, lambda: None,
+               lambda _, n=n: sim.crear_equipos(n, rng=np.random.default_rng(SEMILLA)))
+        yield (f'simular_fase1[{n}]', n,
+               lambda n=n: sim.crear_jugadores(n, np.random.default_rng(SEMILLA)),
+               lambda jugadores: sim.simular_fase1(jugadores))
+        yield (f'simular_fase2[{n}]', n,
+               lambda n=n: sim.crear_equipos(n, rng=np.random.default_rng(SEMILLA)),
+               lambda equipos: sim.simular_fase2(equipos, rng=np.random.default_rng(SEMILLA)))
+
+    for s in simulaciones:
+        yield (f'estadisticas[{s}]', s, lambda: None,
+               lambda _, s=s: sim.estadisticas(s, seed=SEMILLA))
+
+    cliente = app.test_client()
+    for ruta in RUTAS:
+        yield (f'GET {ruta}', 1, lambda: None,
+               lambda _, ruta=ruta: cliente.get(ruta).get_data())
+
+
+def medir(preparar, funcion, repeticiones):
+    """Mejor tiempo de varias repeticiones y memoria pico de una corrida aparte"""
+    tiempos = []
+    for _ in range(repeticiones):
+        entrada = preparar()
+        inicio = time.perf_counter()
+        funcion(entrada)
+        tiempos.append(time.perf_counter() - inicio)
+
+    # tracemalloc frena la ejecución, por eso va separado del cronómetro
+    entrada = preparar()
+    tracemalloc.start()
+    funcion(entrada)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tiempos), pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base', default=ARCHIVO_BASE, help='JSON con la línea base')
+    parser.add_argument('--guardar', action='store_true', help='guarda los resultados como línea base')
+    parser.add_argument('--umbral', type=float, default=0.25,
+                        help='fracción de empeoramiento tolerada antes de marcar regresión')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--rapido', action='store_true', help='omite los tamaños más grandes')
+    parser.add_argument('--filtro', default='', help='solo casos cuyo nombre contenga este texto')
+    args = parser.parse_args()
+
+    base = {}
+    if os.path.exists(args.base):
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+
+    resultados = {}
+    regresiones = []
+    print(f"{'caso':<72}{'tiempo ms':>11}{'unid/s':>13}{'pico MB':>10}{'vs base':>9}")
+    for nombre, unidades, preparar, funcion in casos(args.rapido):
+        if args.filtro not in nombre:
+            continue
+        segundos, pico = medir(preparar, funcion, args.repeticiones)
+        resultados[nombre] = {
+            'segundos': segundos,
+            'throughput': unidades / segundos,
+            'pico_bytes': pico,
+        }
+
+        cambio = ''
+        if nombre in base:
+            relativo = segundos / base[nombre]['segundos'] - 1
+            cambio = f'{relativo:+.0%}'
+            if relativo > args.umbral:
+                regresiones.append(nombre)
+                cambio += ' !'
+        print(f'{nombre:<72}{segundos * 1000:>11.2f}{unidades / segundos:>13.0f}'
+              f'{pico / 2**20:>10.1f}{cambio:>9}')
+
+    if args.guardar:
+        base.update(resultados)
+        with open(args.base, 'w', encoding='utf-8') as f:
+            json.dump(base, f, indent=2, sort_keys=True)
+        print(f'Línea base guardada en {args.base}')
+
+    if regresiones:
+        print(f'{len(regresiones)} regresiones sobre el umbral de {args.umbral:.0%}:')
+        for nombre in regresiones:
+            print(f'  {nombre}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
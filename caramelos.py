@@ -1,44 +1,248 @@
-from flask import Flask, jsonify, request
-import random
+from flask import Flask, Response, g, jsonify, request
+import bisect
+import cProfile
+import functools
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import pstats
+import shutil
+import socket
+import sqlite3
+import tempfile
+import os
+import secrets
 import statistics
-from collections import Counter
+import threading
+import time
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 
 app = Flask(__name__)
 
-class CarameloSimulator:
+# Resultados exactos de fase 2 ya calculados (memoria + disco)
+ARCHIVO_EXACTAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fase2_exacta.json')
+_exactas = OrderedDict()
+
+_bloqueo_exactas = threading.Lock()
+
+# Límites de la solución exacta: la grilla crece con el cuadrado del equipo
+MAX_EQUIPO_EXACTA = 500
+MAX_JUGADORES_EXACTA = 10 ** 9
+MAX_EXACTAS = 128
+
+# Simulaciones por shard de estadisticas(); fijo para que la semilla reproduzca
+TAM_SHARD = 10_000
+
+# Desde cuántos jugadores las rutas usan la representación compacta,
+# y jugadores procesados por bloque para acotar memoria temporal
+UMBRAL_COMPACTO = 10_000
+BLOQUE_COMPACTO = 1 << 20
+
+# Desde cuántas simulaciones el botón Analizar usa la cola de trabajos
+UMBRAL_TRABAJO = 100_000
+
+# Equipos por llamada a intercambiar_lote en barrido(): acota la memoria de la grilla
+FILAS_BARRIDO = 1 << 18
+# Celdas (simulaciones × jugadores × tipos) de los conteos por prefijo de cada bloque de
+# simulaciones en barrido(), y tope de trabajo de una grilla completa
+CELDAS_BLOQUE_BARRIDO = 1 << 23
+MAX_CELDAS_BARRIDO = 1 << 28
+
+# Elementos (corridas × jugadores × 2) por sub-lote de simular_lote_equipos(): acota los
+# códigos int64 sin cambiar el flujo de la semilla en el caso por defecto (30 jugadores)
+ELEMENTOS_LOTE = 1 << 21
+
+# Orden de las columnas de resumen en respuestas tabulares (barrido)
+COLUMNAS_RESUMEN = ['promedio', 'mediana', 'std', 'min', 'max']
+
+# Un generador por hilo: las peticiones concurrentes no comparten estado aleatorio
+_local = threading.local()
+
+def rng_hilo():
+    """Generador aleatorio propio del hilo actual"""
+    if not hasattr(_local, 'rng'):
+        _local.rng = np.random.default_rng()
+    return _local.rng
+
+def rng_peticion(seed=None):
+    """Generador para una petición: reproducible con seed, si no el del hilo"""
+    return np.random.default_rng(seed) if seed is not None else rng_hilo()
+
+# Procesos para estadisticas(): como máximo uno por núcleo, en un pool compartido
+# creado al primer uso. Se usa 'spawn': un fork del servidor con hilos puede
+# heredar bloqueos tomados por otra petición (p. ej. el de las métricas)
+MAX_WORKERS = os.cpu_count() or 1
+_pool_procesos = None
+_bloqueo_pool = threading.Lock()
+
+def pool_procesos():
+    """Pool de procesos compartido por todas las peticiones"""
+    global _pool_procesos
+    with _bloqueo_pool:
+        # Si un hijo murió el pool queda roto para siempre: se reemplaza
+        if _pool_procesos is None or getattr(_pool_procesos, '_broken', False):
+            _pool_procesos = ProcessPoolExecutor(max_workers=MAX_WORKERS,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return _pool_procesos
+
+# Hasta cuántos valores sueltos observar() recorre con bisect en vez de numpy
+LARGO_OBSERVAR_UNO = 64
+
+class Metricas:
+    """Contadores e histogramas en memoria, exportados en formato Prometheus"""
     def __init__(self):
-        self.tipos = ['huevito', 'limon', 'pera']
-        self.reset()
+        self._bloqueo = threading.Lock()
+        self._definiciones = {}  # nombre -> (tipo, ayuda, limites)
+        self._series = {}        # (nombre, etiquetas) -> valor o [cuentas, suma, n]
+    
+    def definir(self, nombre, tipo, ayuda, limites=None):
+        """Registra una métrica: 'counter', 'gauge' o 'histogram'"""
+        self._definiciones[nombre] = (tipo, ayuda, tuple(map(float, limites)) if limites else None)
+    
+    def incrementar(self, nombre, cantidad=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._bloqueo:
+            self._series[clave] = self._series.get(clave, 0) + cantidad
+    
+    def fijar(self, nombre, valor, **etiquetas):
+        with self._bloqueo:
+            self._series[(nombre, tuple(sorted(etiquetas.items())))] = valor
+    
+    def observar(self, nombre, valores, **etiquetas):
+        """Agrega uno o muchos valores (arreglo numpy) a un histograma"""
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        if isinstance(valores, (int, float)):
+            valores = (valores,)
+        # Escalares y listas cortas de Python (duraciones, equipos de una partida): bisect
+        # cuesta menos que crear arreglos numpy
+        if isinstance(valores, (list, tuple)) and len(valores) <= LARGO_OBSERVAR_UNO:
+            for valor in valores:
+                self.observar_uno(clave, valor)
+            return
+        limites = self._definiciones[nombre][2]
+        valores = np.atleast_1d(valores)
+        cuentas = np.bincount(np.searchsorted(limites, valores), minlength=len(limites) + 1)
+        with self._bloqueo:
+            serie = self._series.setdefault(clave, [np.zeros(len(limites) + 1, dtype=np.int64), 0.0, 0])
+            serie[0] += cuentas
+            serie[1] += float(valores.sum())
+            serie[2] += len(valores)
+    
+    def observar_uno(self, clave, valor):
+        """Un solo valor en la serie clave = (nombre, etiquetas): bisect, sin arreglos temporales"""
+        limites = self._definiciones[clave[0]][2]
+        cubeta = bisect.bisect_left(limites, valor)  # igual que np.searchsorted
+        with self._bloqueo:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [np.zeros(len(limites) + 1, dtype=np.int64), 0.0, 0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+            serie[2] += 1
+    
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus"""
+        def formato(etiquetas):
+            return '{' + ','.join(f'{k}="{v}"' for k, v in etiquetas) + '}' if etiquetas else ''
+        
+        lineas = []
+        with self._bloqueo:
+            for nombre, (tipo, ayuda, limites) in self._definiciones.items():
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} {tipo}')
+                for (serie, etiquetas), valor in sorted(self._series.items()):
+                    if serie != nombre:
+                        continue
+                    if tipo != 'histogram':
+                        lineas.append(f'{nombre}{formato(etiquetas)} {valor}')
+                        continue
+                    cuentas, suma, n = valor
+                    for limite, acumulada in zip(list(limites) + ['+Inf'], np.cumsum(cuentas)):
+                        le = limite if limite == '+Inf' else f'{limite:g}'
+                        lineas.append(f'{nombre}_bucket{formato(etiquetas + (("le", le),))} {acumulada}')
+                    lineas.append(f'{nombre}_sum{formato(etiquetas)} {suma}')
+                    lineas.append(f'{nombre}_count{formato(etiquetas)} {n}')
+        return '\n'.join(lineas) + '\n'
+
+LIMITES_SEGUNDOS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60]
+
+metricas = Metricas()
+metricas.definir('caramelos_ruta_segundos', 'histogram', 'Latencia por ruta HTTP', LIMITES_SEGUNDOS)
+metricas.definir('caramelos_fase_segundos', 'histogram', 'Tiempo por fase del simulador', LIMITES_SEGUNDOS)
+metricas.definir('caramelos_intercambios', 'histogram', 'Intercambios por equipo en fase 2',
+                 [0, 1, 2, 5, 10, 20, 50, 100, 1000])
+metricas.definir('caramelos_tope_intercambios_total', 'counter',
+                 'Equipos que llegaron al límite de intercambios')
+metricas.definir('caramelos_simulaciones_total', 'counter', 'Simulaciones completas ejecutadas')
+metricas.definir('caramelos_simulaciones_por_segundo', 'gauge',
+                 'Velocidad de la última llamada a estadisticas')
+
+def medir_fase(fase):
+    """Decorador: registra la duración de la función en caramelos_fase_segundos"""
+    clave = ('caramelos_fase_segundos', (('fase', fase),))
     
-    def reset(self):
-        self.fase = 1
-        self.jugadores = []
-        self.equipos = []
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                metricas.observar_uno(clave, time.perf_counter() - inicio)
+        return envoltura
+    return decorador
+
+def registrar_intercambios(chupetines, max_iteraciones):
+    """Histograma de intercambios por equipo y equipos que tocaron el límite"""
+    metricas.observar('caramelos_intercambios', chupetines)
+    if max_iteraciones is not None:
+        if isinstance(chupetines, list):
+            topes = sum(c >= max_iteraciones for c in chupetines)
+        else:
+            topes = int(np.count_nonzero(np.asarray(chupetines) >= max_iteraciones))
+        metricas.incrementar('caramelos_tope_intercambios_total', topes)
+
+class CarameloSimulator:
+    """Reglas del juego; no guarda estado de partidas, es seguro entre hilos"""
+    def __init__(self, max_iteraciones=50, tipos=None, costo=2, recompensa=2):
+        self.tipos = tipos or ['huevito', 'limon', 'pera']
+        self.max_iteraciones = max_iteraciones  # None = sin límite
+        self.costo = costo            # caramelos de cada tipo por intercambio
+        self.recompensa = recompensa  # caramelos al azar devueltos por intercambio
     
-    def generar_caramelos(self, cantidad):
+    @medir_fase('generar_caramelos')
+    def generar_caramelos(self, cantidad, rng=None):
         """Genera caramelos usando numpy para mejor performance"""
-        return np.random.choice(self.tipos, cantidad).tolist()
+        rng = rng if rng is not None else rng_hilo()
+        return [self.tipos[c] for c in rng.integers(0, len(self.tipos), cantidad)]
     
-    def crear_jugadores(self, num_jugadores=30):
-        """Crea jugadores optimizado"""
-        self.fase = 1
-        self.jugadores = [
-            {'id': i+1, 'caramelos': self.generar_caramelos(2), 'salvado': False}
+    @medir_fase('crear_jugadores')
+    def crear_jugadores(self, num_jugadores=30, rng=None):
+        """Crea los jugadores de una partida de fase 1"""
+        rng = rng if rng is not None else rng_hilo()
+        caramelos = self.generar_caramelos(2 * num_jugadores, rng)
+        return [
+            {'id': i+1, 'caramelos': caramelos[2*i:2*i+2], 'salvado': False}
             for i in range(num_jugadores)
         ]
-        return self.jugadores
     
-    def crear_equipos(self, num_jugadores=30, por_equipo=15):
-        """Crea equipos optimizado"""
-        self.fase = 2
+    @medir_fase('crear_equipos')
+    def crear_equipos(self, num_jugadores=30, por_equipo=15, rng=None):
+        """Crea los equipos de una partida de fase 2"""
+        rng = rng if rng is not None else rng_hilo()
+        caramelos = self.generar_caramelos(2 * num_jugadores, rng)
         jugadores = [
-            {'id': i+1, 'caramelos': self.generar_caramelos(2)}
+            {'id': i+1, 'caramelos': caramelos[2*i:2*i+2]}
             for i in range(num_jugadores)
         ]
         
-        random.shuffle(jugadores)
-        self.equipos = [
+        jugadores = [jugadores[i] for i in rng.permutation(num_jugadores)]
+        return [
             {
                 'id': i//por_equipo + 1,
                 'jugadores': jugadores[i:i+por_equipo],
@@ -46,21 +250,21 @@ class CarameloSimulator:
             }
             for i in range(0, num_jugadores, por_equipo)
         ]
-        return self.equipos
     
     def contar_caramelos(self, caramelos):
         """Cuenta caramelos más eficientemente"""
         contador = Counter(caramelos)
         return {tipo: contador.get(tipo, 0) for tipo in self.tipos}
     
-    def simular_fase1(self):
-        """Simula fase 1 optimizada"""
-        if not self.jugadores:
+    @medir_fase('fase1')
+    def simular_fase1(self, jugadores):
+        """Simula fase 1 sobre los jugadores dados"""
+        if not jugadores:
             return {}
         
         # Recolectar todos los caramelos
         todos_caramelos = []
-        for jugador in self.jugadores:
+        for jugador in jugadores:
             todos_caramelos.extend(jugador['caramelos'])
         
         # Contar y calcular chupetines
@@ -68,8 +272,8 @@ class CarameloSimulator:
         chupetines = min(contador.values())
         
         # Marcar salvados
-        for i in range(min(chupetines, len(self.jugadores))):
-            self.jugadores[i]['salvado'] = True
+        for i in range(min(chupetines, len(jugadores))):
+            jugadores[i]['salvado'] = True
         
         return {
             'fase': 1,
@@ -77,42 +281,59 @@ class CarameloSimulator:
             'distribucion': contador,
             'chupetines': chupetines,
             'salvados': chupetines,
-            'eficiencia': round((chupetines / len(self.jugadores)) * 100, 1)
+            'eficiencia': round((chupetines / len(jugadores)) * 100, 1)
         }
     
-    def simular_fase2(self):
-        """Simula fase 2 con bucle optimizado"""
-        if not self.equipos:
+    def intercambiar(self, conteo, max_iteraciones=None, rng=None):
+        """Aplica intercambios sobre un vector de conteos, O(1) por paso"""
+        if max_iteraciones is None:
+            max_iteraciones = self.max_iteraciones
+        rng = rng if rng is not None else rng_hilo()
+        n_tipos = len(self.tipos)
+        conteo = list(conteo)
+        chupetines = 0
+        nuevos = []
+        
+        while max_iteraciones is None or chupetines < max_iteraciones:
+            # Verificar si puede intercambiar (costo de cada tipo)
+            if min(conteo) < self.costo:
+                break
+            for t in range(n_tipos):
+                conteo[t] -= self.costo
+            
+            # Agregar caramelos aleatorios, sorteados por bloques
+            for _ in range(self.recompensa):
+                if not nuevos:
+                    nuevos = rng.integers(0, n_tipos, size=512).tolist()
+                conteo[nuevos.pop()] += 1
+            chupetines += 1
+        
+        return chupetines, conteo
+    
+    @medir_fase('fase2')
+    def simular_fase2(self, equipos, max_iteraciones=None, rng=None):
+        """Simula fase 2 sobre los equipos dados, con conteos por equipo"""
+        if not equipos:
             return {}
         
         resultados = []
+        tiempo_conteo = tiempo_intercambios = 0.0
         
-        for equipo in self.equipos:
-            # Recolectar caramelos del equipo
-            caramelos = []
+        for equipo in equipos:
+            # Contar caramelos del equipo una sola vez
+            inicio = time.perf_counter()
+            contador = Counter()
             for jugador in equipo['jugadores']:
-                caramelos.extend(jugador['caramelos'])
+                contador.update(jugador['caramelos'])
+            medio = time.perf_counter()
             
-            chupetines = 0
-            iteraciones = 0
-            
-            # Bucle de intercambios optimizado
-            while iteraciones < 50:  # Límite reducido
-                contador = self.contar_caramelos(caramelos)
-                
-                # Verificar si puede intercambiar (2 de cada tipo)
-                if all(contador[tipo] >= 2 for tipo in self.tipos):
-                    # Realizar intercambio
-                    for tipo in self.tipos:
-                        for _ in range(2):
-                            caramelos.remove(tipo)
-                    
-                    # Agregar 2 caramelos aleatorios
-                    caramelos.extend(self.generar_caramelos(2))
-                    chupetines += 1
-                    iteraciones += 1
-                else:
-                    break
+            # Cada intercambio da exactamente un chupetín
+            iteraciones, _ = self.intercambiar(
+                [contador[tipo] for tipo in self.tipos], max_iteraciones, rng
+            )
+            chupetines = iteraciones
+            tiempo_conteo += medio - inicio
+            tiempo_intercambios += time.perf_counter() - medio
             
             equipo['chupetines'] = chupetines
             resultados.append({
@@ -122,9 +343,14 @@ class CarameloSimulator:
                 'iteraciones': iteraciones
             })
         
+        metricas.observar('caramelos_fase_segundos', tiempo_conteo, fase='fase2_conteo')
+        metricas.observar('caramelos_fase_segundos', tiempo_intercambios, fase='fase2_intercambios')
+        registrar_intercambios([r['iteraciones'] for r in resultados],
+                               self.max_iteraciones if max_iteraciones is None else max_iteraciones)
+        
         # Encontrar ganador
-        max_chupetines = max(eq['chupetines'] for eq in self.equipos)
-        ganadores = [eq for eq in self.equipos if eq['chupetines'] == max_chupetines]
+        max_chupetines = max(eq['chupetines'] for eq in equipos)
+        ganadores = [eq for eq in equipos if eq['chupetines'] == max_chupetines]
         
         return {
             'fase': 2,
@@ -133,42 +359,804 @@ class CarameloSimulator:
             'max_chupetines': max_chupetines
         }
     
-    def estadisticas(self, simulaciones=1000):
-        """Calcula estadísticas usando numpy para mejor performance"""
-        f1_results = []
-        f2_results = []
+    @medir_fase('crear_compacto')
+    def crear_juego_compacto(self, num_jugadores=30, por_equipo=15, rng=None):
+        """Crea una partida compacta: matriz uint8 de caramelos, sin dicts por jugador"""
+        rng = rng if rng is not None else rng_hilo()
+        # Los caramelos son iid: los equipos pueden ser rangos contiguos sin barajar
+        caramelos = rng.integers(0, len(self.tipos), size=(num_jugadores, 2), dtype=np.uint8)
+        return JuegoCompacto(caramelos, por_equipo)
+    
+    @medir_fase('fase1_compacto')
+    def simular_fase1_compacto(self, juego):
+        """Simula fase 1 sobre una partida compacta"""
+        if juego.num_jugadores == 0:
+            return {}
+        n_tipos = len(self.tipos)
+        conteo = np.zeros(n_tipos, dtype=np.int64)
+        for inicio in range(0, juego.num_jugadores, BLOQUE_COMPACTO):
+            conteo += np.bincount(juego.caramelos[inicio:inicio + BLOQUE_COMPACTO].ravel(),
+                                  minlength=n_tipos)
+        chupetines = int(conteo.min())
+        juego.marcar_salvados(chupetines)
+        
+        return {
+            'fase': 1,
+            'total_caramelos': 2 * juego.num_jugadores,
+            'distribucion': {tipo: int(c) for tipo, c in zip(self.tipos, conteo)},
+            'chupetines': chupetines,
+            'salvados': chupetines,
+            'eficiencia': round((chupetines / juego.num_jugadores) * 100, 1)
+        }
+    
+    @medir_fase('fase2_compacto')
+    def simular_fase2_compacto(self, juego, max_iteraciones=None, rng=None,
+                               pagina=1, por_pagina=50):
+        """Simula fase 2 sobre una partida compacta; devuelve los equipos paginados"""
+        if pagina < 1 or por_pagina < 1:
+            raise ValueError('pagina y por_pagina deben ser al menos 1')
+        if juego.num_jugadores == 0:
+            return {}
+        n_tipos = len(self.tipos)
+        conteos = np.zeros(juego.num_equipos * n_tipos, dtype=np.int32)
+        for inicio in range(0, juego.num_jugadores, BLOQUE_COMPACTO):
+            bloque = juego.caramelos[inicio:inicio + BLOQUE_COMPACTO]
+            equipo = np.arange(inicio, inicio + len(bloque)) // juego.por_equipo
+            # Solo los equipos que toca este bloque
+            base = equipo[0]
+            parcial = np.bincount(((equipo - base)[:, None] * n_tipos + bloque).ravel())
+            conteos[base * n_tipos:base * n_tipos + len(parcial)] += parcial.astype(np.int32)
+        juego.chupetines = self.intercambiar_lote(
+            conteos.reshape(-1, n_tipos), max_iteraciones, rng
+        ).astype(np.int32)
+        
+        max_chupetines = int(juego.chupetines.max())
+        ganadores = np.flatnonzero(juego.chupetines == max_chupetines)
+        primero = (pagina - 1) * por_pagina
+        ids = np.arange(primero, min(primero + por_pagina, juego.num_equipos))
+        
+        return {
+            'fase': 2,
+            'equipos': [
+                {
+                    'equipo_id': int(i) + 1,
+                    'jugadores': juego.tamano_equipo(i),
+                    'chupetines': int(juego.chupetines[i]),
+                    'iteraciones': int(juego.chupetines[i])
+                }
+                for i in ids
+            ],
+            'num_equipos': juego.num_equipos,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'distribucion_chupetines': np.bincount(juego.chupetines).tolist(),
+            'ganador': int(ganadores[0]) + 1 if len(ganadores) == 1 else 'Empate',
+            'max_chupetines': max_chupetines
+        }
+    
+    def simular_lote(self, simulaciones, num_jugadores=30, por_equipo=15, rng=None):
+        """Simula todas las corridas a la vez como arreglos numpy"""
+        f1, equipos = self.simular_lote_equipos(simulaciones, num_jugadores, por_equipo, rng)
+        return f1, equipos.max(axis=1)
+    
+    @medir_fase('lote')
+    def simular_lote_equipos(self, simulaciones, num_jugadores=30, por_equipo=15, rng=None):
+        """Como simular_lote, pero con los chupetines de cada (corrida, equipo)"""
+        rng = rng if rng is not None else rng_hilo()
+        filas = max(1, ELEMENTOS_LOTE // (2 * max(num_jugadores, 1)))
+        if simulaciones <= filas:
+            return self._lote_equipos(simulaciones, num_jugadores, por_equipo, rng)
+        
+        # Muchos jugadores: sub-lotes de corridas para que los códigos no crezcan sin límite
+        partes = [self._lote_equipos(min(filas, simulaciones - inicio), num_jugadores,
+                                     por_equipo, rng)
+                  for inicio in range(0, simulaciones, filas)]
+        return (np.concatenate([f1 for f1, _ in partes]),
+                np.concatenate([equipos for _, equipos in partes]))
+    
+    def _lote_equipos(self, simulaciones, num_jugadores, por_equipo, rng):
+        """Un sub-lote de simular_lote_equipos con el rng dado"""
+        n_tipos = len(self.tipos)
+        corrida = np.arange(simulaciones)[:, None, None]
+        
+        # Fase 1: códigos (simulaciones, jugadores, 2) y mínimo de cada bincount
+        codigos = rng.integers(0, n_tipos, size=(simulaciones, num_jugadores, 2))
+        conteos = np.bincount((corrida * n_tipos + codigos).ravel(),
+                              minlength=simulaciones * n_tipos)
+        f1 = conteos.reshape(simulaciones, n_tipos).min(axis=1)
+        
+        # Fase 2: vector de conteos por (corrida, equipo)
+        n_equipos = -(-num_jugadores // por_equipo)
+        equipo = (np.arange(num_jugadores) // por_equipo)[None, :, None]
+        codigos = rng.integers(0, n_tipos, size=(simulaciones, num_jugadores, 2))
+        indice = (corrida * n_equipos + equipo) * n_tipos + codigos
+        conteos = np.bincount(indice.ravel(), minlength=simulaciones * n_equipos * n_tipos)
+        chupetines = self.intercambiar_lote(conteos.reshape(-1, n_tipos), rng=rng)
+        
+        return f1, chupetines.reshape(simulaciones, n_equipos)
+    
+    def tipo_chupetines(self):
+        """Tipo entero de los chupetines por equipo: int16 solo si el tope de iteraciones cabe"""
+        if self.max_iteraciones is not None and self.max_iteraciones <= np.iinfo(np.int16).max:
+            return np.int16
+        return np.int32
+    
+    def resultados_por_shard(self, simulaciones, num_jugadores=30, por_equipo=15, seed=None):
+        """Genera (inicio, fase1, chupetines por equipo) shard a shard, con las semillas de estadisticas()"""
+        hijos = np.random.SeedSequence(seed).spawn(-(-simulaciones // TAM_SHARD))
+        for i, hijo in enumerate(hijos):
+            inicio = i * TAM_SHARD
+            tamano = min(TAM_SHARD, simulaciones - inicio)
+            f1, equipos = self.simular_lote_equipos(tamano, num_jugadores, por_equipo,
+                                                    np.random.default_rng(hijo))
+            yield inicio, f1, equipos
+    
+    def metadatos_exportacion(self, simulaciones, num_jugadores=30, por_equipo=15, seed=None):
+        """Descripción de una exportación: parámetros, reglas y columnas"""
+        n_equipos = -(-num_jugadores // por_equipo)
+        return {
+            'simulaciones': simulaciones,
+            'jugadores': num_jugadores,
+            'por_equipo': por_equipo,
+            'equipo_jugadores': [min(por_equipo, num_jugadores - e * por_equipo)
+                                 for e in range(n_equipos)],
+            'seed': seed,
+            'max_iteraciones': self.max_iteraciones,
+            'costo': self.costo,
+            'recompensa': self.recompensa,
+            # Cada intercambio da un chupetín: también son las iteraciones por equipo
+            'columnas': ['fase1_chupetines', 'fase2_max_chupetines', 'equipo_chupetines']
+        }
+    
+    @medir_fase('exportar')
+    def exportar_resultados(self, directorio, simulaciones, num_jugadores=30, por_equipo=15,
+                            seed=None):
+        """Escribe los resultados crudos por corrida como .npy, bloque a bloque"""
+        os.makedirs(directorio, exist_ok=True)
+        n_equipos = -(-num_jugadores // por_equipo)
+        columnas = {
+            'fase1_chupetines': ((simulaciones,), np.int32),
+            'fase2_max_chupetines': ((simulaciones,), np.int32),
+            'equipo_chupetines': ((simulaciones, n_equipos), self.tipo_chupetines()),
+        }
+        salidas = {
+            nombre: np.lib.format.open_memmap(os.path.join(directorio, f'{nombre}.npy'),
+                                              mode='w+', dtype=dtype, shape=forma)
+            for nombre, (forma, dtype) in columnas.items()
+        }
+        
+        for inicio, f1, equipos in self.resultados_por_shard(simulaciones, num_jugadores,
+                                                             por_equipo, seed):
+            fin = inicio + len(f1)
+            salidas['fase1_chupetines'][inicio:fin] = f1
+            salidas['fase2_max_chupetines'][inicio:fin] = equipos.max(axis=1)
+            salidas['equipo_chupetines'][inicio:fin] = equipos
+            for salida in salidas.values():
+                salida.flush()
+        
+        metadatos = self.metadatos_exportacion(simulaciones, num_jugadores, por_equipo, seed)
+        with open(os.path.join(directorio, 'metadatos.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadatos, f, indent=2)
+        return metadatos
+    
+    @medir_fase('intercambios_lote')
+    def intercambiar_lote(self, conteos, max_iteraciones=None, rng=None, costo=None):
+        """Aplica los intercambios de fase 2 a muchos equipos a la vez"""
+        if max_iteraciones is None:
+            max_iteraciones = self.max_iteraciones
+        rng = rng if rng is not None else rng_hilo()
+        n_tipos = conteos.shape[1]
+        # costo puede ser un escalar o un valor por fila (barridos)
+        costo = np.broadcast_to(self.costo if costo is None else costo, (len(conteos),))[:, None]
+        conteos = conteos.copy()
+        chupetines = np.zeros(len(conteos), dtype=np.int64)
+        activos = np.arange(len(conteos))
+        
+        iteraciones = 0
+        while max_iteraciones is None or iteraciones < max_iteraciones:
+            iteraciones += 1
+            activos = activos[(conteos[activos] >= costo[activos]).all(axis=1)]
+            if activos.size == 0:
+                break
+            nuevos = rng.integers(0, n_tipos, size=(activos.size, self.recompensa), dtype=np.uint8)
+            conteos[activos] += ((nuevos[:, :, None] == np.arange(n_tipos, dtype=np.uint8))
+                                 .sum(axis=1, dtype=conteos.dtype) - costo[activos])
+            chupetines[activos] += 1
+        
+        registrar_intercambios(chupetines, max_iteraciones)
+        return chupetines
+    
+    def distribucion_equipo(self, tamano, max_iteraciones=None):
+        """Distribución exacta de chupetines de un equipo (cadena de Markov)"""
+        if max_iteraciones is None:
+            max_iteraciones = self.max_iteraciones
+        if len(self.tipos) != 3 or 3 * self.costo <= self.recompensa:
+            raise ValueError('La solución exacta requiere 3 tipos y intercambios que consuman caramelos')
+        if not 1 <= tamano <= MAX_EQUIPO_EXACTA:
+            raise ValueError(f'La solución exacta admite equipos de 1 a {MAX_EQUIPO_EXACTA} jugadores')
+        total = 2 * tamano
+        c = self.costo
+        
+        # Estado (huevito, limon) en una grilla; pera = total - huevito - limon
+        ejes = np.arange(total + 1)
+        log_fact = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, total + 1)))))
+        p = total - ejes[:, None] - ejes[None, :]
+        prob = np.exp(
+            log_fact[total] - log_fact[ejes][:, None] - log_fact[ejes][None, :]
+            - log_fact[np.maximum(p, 0)] - total * np.log(3)
+        )
+        prob[p < 0] = 0.0
+        del p
+        
+        # Sorteo de los caramelos nuevos: (+huevito, +limon) y su probabilidad multinomial
+        r = self.recompensa
+        sorteos = [
+            ((a, b), math.comb(r, a) * math.comb(r - a, b) / 3 ** r)
+            for a in range(r + 1) for b in range(r + 1 - a)
+        ]
+        
+        distribucion = []
+        while True:
+            # Activos: huevito, limon y pera >= costo; en la subgrilla desde (c, c)
+            # son las celdas i + j <= total - 3c
+            m = max(total - 3 * c + 1, 0)
+            triangulo = np.add.outer(np.arange(m), np.arange(m)) < m
+            activos = np.where(triangulo, prob[c:c + m, c:c + m], 0.0)
+            if max_iteraciones is not None and len(distribucion) == max_iteraciones:
+                distribucion.append(prob.sum())
+                break
+            distribucion.append(prob.sum() - activos.sum())
+            if not activos.any():
+                break
+            
+            # Cada intercambio quita `costo` de cada tipo y agrega `recompensa` al azar;
+            # la grilla siguiente solo cubre el nuevo total de caramelos
+            total -= 3 * c - r
+            prob = np.zeros((total + 1, total + 1))
+            for (dh, dl), peso in sorteos:
+                prob[dh:dh + m, dl:dl + m] += peso * activos
+        
+        return np.array(distribucion)
+    
+    @medir_fase('fase2_exacta')
+    def fase2_exacta(self, num_jugadores=30, por_equipo=15, max_iteraciones=None):
+        """Distribución exacta de fase 2 memoizada en memoria y en disco"""
+        if max_iteraciones is None:
+            max_iteraciones = self.max_iteraciones
+        clave = f'{num_jugadores}-{por_equipo}-{max_iteraciones}-{self.costo}-{self.recompensa}'
+        with _bloqueo_exactas:
+            if not _exactas and os.path.exists(ARCHIVO_EXACTAS):
+                with open(ARCHIVO_EXACTAS, encoding='utf-8') as f:
+                    _exactas.update(list(json.load(f).items())[-MAX_EXACTAS:])
+            if clave in _exactas:
+                _exactas.move_to_end(clave)
+                return _exactas[clave]
+        
+        # Equipos completos y, si sobra, un equipo incompleto
+        tamanos = Counter({por_equipo: num_jugadores // por_equipo})
+        if num_jugadores % por_equipo:
+            tamanos[num_jugadores % por_equipo] += 1
+        
+        equipos = []
+        acumulada = np.ones(1)
+        for tamano, cantidad in sorted(t for t in tamanos.items() if t[1]):
+            dist = self.distribucion_equipo(tamano, max_iteraciones)
+            k = np.arange(len(dist))
+            equipos.append({
+                'jugadores': tamano,
+                'cantidad': cantidad,
+                'esperado': round(float(dist @ k), 6),
+                'distribucion': dist.tolist()
+            })
+            # Equipos independientes: P(max <= k) = producto de P(X <= k)
+            cdf = np.cumsum(dist)
+            largo = max(len(acumulada), len(cdf))
+            acumulada = (np.pad(acumulada, (0, largo - len(acumulada)), constant_values=1.0)
+                         * np.pad(cdf, (0, largo - len(cdf)), constant_values=1.0) ** cantidad)
+        
+        dist_max = np.diff(acumulada, prepend=0.0)
+        k = np.arange(len(dist_max))
+        esperado = float(dist_max @ k)
+        resultado = {
+            'jugadores': num_jugadores,
+            'por_equipo': por_equipo,
+            'max_iteraciones': max_iteraciones,
+            'costo': self.costo,
+            'recompensa': self.recompensa,
+            'equipos': equipos,
+            'max_chupetines': {
+                'esperado': round(esperado, 6),
+                'std': round(float(np.sqrt(dist_max @ (k - esperado) ** 2)), 6),
+                'mediana': int(np.searchsorted(acumulada, 0.5)),
+                'distribucion': dist_max.tolist()
+            }
+        }
+        
+        with _bloqueo_exactas:
+            _exactas[clave] = resultado
+            # El memo en disco se reescribe entero: se acota a las últimas MAX_EXACTAS
+            while len(_exactas) > MAX_EXACTAS:
+                _exactas.popitem(last=False)
+            temporal = f'{ARCHIVO_EXACTAS}.{os.getpid()}.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(_exactas, f)
+            os.replace(temporal, ARCHIVO_EXACTAS)
+        return resultado
+    
+    @medir_fase('estadisticas')
+    def estadisticas(self, simulaciones=1000, seed=None, workers=1):
+        """Calcula estadísticas por shards con semillas SeedSequence independientes"""
+        # Los shards no dependen de workers: misma semilla, mismo resultado
+        tamanos = [TAM_SHARD] * (simulaciones // TAM_SHARD)
+        if simulaciones % TAM_SHARD:
+            tamanos.append(simulaciones % TAM_SHARD)
+        inicio = time.perf_counter()
+        hijos = np.random.SeedSequence(seed).spawn(len(tamanos))
+        tareas = [(tamano, hijo, self) for tamano, hijo in zip(tamanos, hijos)]
+        
+        workers = max(1, min(workers, MAX_WORKERS))
+        if workers > 1 and len(tareas) > 1:
+            # Los shards van en `workers` grupos: la petición ocupa a lo sumo workers procesos
+            parciales = list(pool_procesos().map(_correr_shard, tareas,
+                                                 chunksize=-(-len(tareas) // workers)))
+        else:
+            parciales = [_correr_shard(tarea) for tarea in tareas]
+        
+        # Combinación en orden fijo de shards
+        f1, f2 = Acumulador(), Acumulador()
+        for parcial_f1, parcial_f2 in parciales:
+            f1.combinar(parcial_f1)
+            f2.combinar(parcial_f2)
+        
+        metricas.incrementar('caramelos_simulaciones_total', simulaciones)
+        metricas.fijar('caramelos_simulaciones_por_segundo',
+                       round(simulaciones / (time.perf_counter() - inicio), 1))
+        return {
+            'fase1': f1.resumen(),
+            'fase2': f2.resumen(),
+            'simulaciones': simulaciones
+        }
+
+    def estadisticas_stream(self, simulaciones=1000, seed=None, ancho_ic=None, lote=100):
+        """Genera resúmenes parciales por lotes crecientes, con parada temprana"""
+        raiz = np.random.SeedSequence(seed)
+        f1, f2 = Acumulador(), Acumulador()
         
-        for _ in range(simulaciones):
-            # Fase 1
-            self.crear_jugadores()
-            result_f1 = self.simular_fase1()
-            f1_results.append(result_f1['chupetines'])
+        while f1.n < simulaciones:
+            tamano = min(lote, simulaciones - f1.n)
+            parcial_f1, parcial_f2 = _correr_shard((tamano, raiz.spawn(1)[0], self))
+            f1.combinar(parcial_f1)
+            f2.combinar(parcial_f2)
+            metricas.incrementar('caramelos_simulaciones_total', tamano)
+            lote = min(2 * lote, TAM_SHARD)
             
-            # Fase 2
-            self.crear_equipos()
-            result_f2 = self.simular_fase2()
-            f2_results.append(result_f2['max_chupetines'])
+            # Converge cuando ambos IC del 95% son más angostos que ancho_ic
+            convergido = bool(ancho_ic is not None and f1.n > 1
+                              and max(f1.ancho_ic(), f2.ancho_ic()) <= ancho_ic)
+            yield {
+                'fase1': f1.resumen(),
+                'fase2': f2.resumen(),
+                'simulaciones': f1.n,
+                'objetivo': simulaciones,
+                'ic95': {'fase1': round(f1.ancho_ic(), 4), 'fase2': round(f2.ancho_ic(), 4)},
+                'convergido': convergido,
+                'terminado': convergido or f1.n >= simulaciones
+            }
+            if convergido:
+                break
+
+    @medir_fase('barrido')
+    def barrido(self, jugadores, por_equipo=(15,), tipos=None, costos=None,
+                simulaciones=200, seed=None):
+        """Evalúa una grilla de parámetros en una pasada vectorizada por lista de tipos"""
+        rng = np.random.default_rng(seed)
+        listas_tipos = tipos or [self.tipos]
+        costos = costos or [self.costo]
+        if celdas_barrido(jugadores, por_equipo, listas_tipos, costos, simulaciones) > MAX_CELDAS_BARRIDO:
+            raise ValueError(f'La grilla supera {MAX_CELDAS_BARRIDO} celdas de trabajo')
+        max_jugadores = max(jugadores)
+        filas = []
+        
+        for lista in listas_tipos:
+            n_tipos = len(lista)
+            resultados = {(n, p, costo): (Acumulador(), Acumulador())
+                          for n in jugadores for p in por_equipo for costo in costos}
+            # Bloques de simulaciones: los conteos por prefijo no crecen con simulaciones
+            por_bloque = max(1, CELDAS_BLOQUE_BARRIDO // ((max_jugadores + 1) * n_tipos))
+            for inicio in range(0, simulaciones, por_bloque):
+                bloque_sims = min(por_bloque, simulaciones - inicio)
+                self._barrido_bloque(jugadores, por_equipo, costos, n_tipos, bloque_sims,
+                                     rng, resultados)
+            for (n, p, costo), (f1, f2) in resultados.items():
+                filas.append([n, p, n_tipos, costo]
+                             + [f1.resumen()[c] for c in COLUMNAS_RESUMEN]
+                             + [f2.resumen()[c] for c in COLUMNAS_RESUMEN])
         
         return {
-            'fase1': {
-                'promedio': round(np.mean(f1_results), 2),
-                'mediana': int(np.median(f1_results)),
-                'std': round(np.std(f1_results), 2),
-                'min': int(np.min(f1_results)),
-                'max': int(np.max(f1_results))
-            },
-            'fase2': {
-                'promedio': round(np.mean(f2_results), 2),
-                'mediana': int(np.median(f2_results)),
-                'std': round(np.std(f2_results), 2),
-                'min': int(np.min(f2_results)),
-                'max': int(np.max(f2_results))
-            },
+            'columnas': ['jugadores', 'por_equipo', 'tipos', 'costo']
+                        + [f'fase1_{c}' for c in COLUMNAS_RESUMEN]
+                        + [f'fase2_{c}' for c in COLUMNAS_RESUMEN],
+            'filas': filas,
             'simulaciones': simulaciones
         }
+    
+    def _barrido_bloque(self, jugadores, por_equipo, costos, n_tipos, simulaciones, rng,
+                        resultados):
+        """Un bloque de simulaciones de barrido(): agrega a los acumuladores de cada punto"""
+        max_jugadores = max(jugadores)
+        # Mismos sorteos para todos los puntos: conteos acumulados por prefijo de jugadores,
+        # un tipo a la vez para no crear un temporal (simulaciones, jugadores, 2, tipos)
+        acumulados = []
+        for _ in range(2):
+            codigos = rng.integers(0, n_tipos, size=(simulaciones, max_jugadores, 2), dtype=np.uint8)
+            acumulado = np.zeros((simulaciones, max_jugadores + 1, n_tipos), dtype=np.int32)
+            for t in range(n_tipos):
+                por_jugador = (codigos[..., 0] == t).view(np.uint8) + (codigos[..., 1] == t)
+                np.cumsum(por_jugador, axis=1, out=acumulado[:, 1:, t])
+            acumulados.append(acumulado)
+        acumulado_f1, acumulado_f2 = acumulados
+        
+        # Los equipos de varios puntos se juntan en un arreglo de conteos, por lotes
+        # de hasta FILAS_BARRIDO filas para que la memoria no crezca con la grilla
+        puntos, bloques, costo_filas = [], [], []
+        
+        def vaciar():
+            chupetines = self.intercambiar_lote(np.concatenate(bloques), rng=rng,
+                                                costo=np.concatenate(costo_filas))
+            inicio = 0
+            for (n, p, costo, n_equipos), bloque in zip(puntos, bloques):
+                f1, f2 = resultados[n, p, costo]
+                f1.agregar(acumulado_f1[:, n].min(axis=1))
+                f2.agregar(chupetines[inicio:inicio + len(bloque)].reshape(simulaciones, n_equipos).max(axis=1))
+                inicio += len(bloque)
+            puntos.clear()
+            bloques.clear()
+            costo_filas.clear()
+        
+        for n in jugadores:
+            for p in por_equipo:
+                limites = np.append(np.arange(0, n, p), n)
+                equipos = (acumulado_f2[:, limites[1:]] - acumulado_f2[:, limites[:-1]]).reshape(-1, n_tipos)
+                for costo in costos:
+                    if bloques and sum(map(len, bloques)) + len(equipos) > FILAS_BARRIDO:
+                        vaciar()
+                    puntos.append((n, p, costo, len(limites) - 1))
+                    bloques.append(equipos)
+                    costo_filas.append(np.full(len(equipos), costo))
+        if bloques:
+            vaciar()
+
+def celdas_barrido(jugadores, por_equipo, listas_tipos, costos, simulaciones):
+    """Trabajo de una grilla de barrido(): conteos por prefijo más conteos de equipos"""
+    equipos = len(costos) * sum(-(-n // p) for n in jugadores for p in por_equipo)
+    return simulaciones * (max(jugadores) + equipos) * sum(map(len, listas_tipos))
 
-# Instancia global
+class JuegoCompacto:
+    """Partida en estructura de arreglos: caramelos uint8, salvados en bits, equipos por rango"""
+    def __init__(self, caramelos, por_equipo):
+        self.caramelos = caramelos  # (jugadores, 2) códigos de tipo
+        self.por_equipo = por_equipo
+        self.salvados = np.zeros((len(caramelos) + 7) // 8, dtype=np.uint8)
+        self.chupetines = None      # por equipo, tras fase 2
+    
+    @property
+    def num_jugadores(self):
+        return len(self.caramelos)
+    
+    @property
+    def num_equipos(self):
+        return -(-self.num_jugadores // self.por_equipo)
+    
+    def tamano_equipo(self, i):
+        """Jugadores del equipo i: rango [i*por_equipo, (i+1)*por_equipo)"""
+        return int(min(self.por_equipo, self.num_jugadores - i * self.por_equipo))
+    
+    def marcar_salvados(self, cantidad):
+        """Marca como salvados a los primeros `cantidad` jugadores"""
+        cantidad = min(cantidad, self.num_jugadores)
+        self.salvados[:] = 0
+        self.salvados[:cantidad // 8] = 0xFF
+        if cantidad % 8:
+            self.salvados[cantidad // 8] = (0xFF << (8 - cantidad % 8)) & 0xFF
+    
+    def salvado(self, i):
+        return bool(self.salvados[i // 8] >> (7 - i % 8) & 1)
+    
+    def bytes_usados(self):
+        return self.caramelos.nbytes + self.salvados.nbytes + (
+            self.chupetines.nbytes if self.chupetines is not None else 0)
+
+class Acumulador:
+    """Media/varianza (Welford-Chan), histograma, mínimo y máximo combinables"""
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.histograma = np.zeros(0, dtype=np.int64)
+    
+    def agregar(self, valores):
+        """Agrega un lote de resultados enteros no negativos"""
+        parcial = Acumulador()
+        parcial.n = len(valores)
+        if parcial.n:
+            parcial.media = float(np.mean(valores))
+            parcial.m2 = float(np.sum((valores - parcial.media) ** 2))
+            parcial.histograma = np.bincount(valores)
+        self.combinar(parcial)
+    
+    def combinar(self, otro):
+        """Combina con otro acumulador (fórmula de Chan)"""
+        if otro.n == 0:
+            return
+        n = self.n + otro.n
+        delta = otro.media - self.media
+        self.media += delta * otro.n / n
+        self.m2 += otro.m2 + delta ** 2 * self.n * otro.n / n
+        self.n = n
+        largo = max(len(self.histograma), len(otro.histograma))
+        self.histograma = (np.pad(self.histograma, (0, largo - len(self.histograma)))
+                           + np.pad(otro.histograma, (0, largo - len(otro.histograma))))
+    
+    def mediana(self):
+        """Mediana exacta a partir del histograma (igual que np.median)"""
+        acumulada = np.cumsum(self.histograma)
+        bajo = int(np.searchsorted(acumulada, (self.n - 1) // 2 + 1))
+        alto = int(np.searchsorted(acumulada, self.n // 2 + 1))
+        return (bajo + alto) / 2
+    
+    def ancho_ic(self, z=1.96):
+        """Ancho del intervalo de confianza de la media"""
+        return float(2 * z * np.sqrt(self.m2 / self.n) / np.sqrt(self.n))
+    
+    def resumen(self):
+        """Resumen con el mismo formato que antes"""
+        presentes = np.flatnonzero(self.histograma)
+        return {
+            'promedio': round(self.media, 2),
+            'mediana': int(self.mediana()),
+            'std': round(float(np.sqrt(self.m2 / self.n)), 2),
+            'min': int(presentes[0]),
+            'max': int(presentes[-1])
+        }
+
+def _correr_shard(tarea):
+    """Corre un shard con su propio flujo aleatorio (apto para procesos)"""
+    simulaciones, semilla, simulador = tarea
+    f1_results, f2_results = simulador.simular_lote(
+        simulaciones, rng=np.random.default_rng(semilla)
+    )
+    f1, f2 = Acumulador(), Acumulador()
+    f1.agregar(f1_results)
+    f2.agregar(f2_results)
+    return f1, f2
+
+class CacheResultados:
+    """Cache LRU con TTL para resultados con semilla, opcionalmente en disco"""
+    def __init__(self, max_entradas=256, ttl=3600, archivo=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.archivo = archivo
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()  # clave -> (expira, resultado)
+        self._bloqueo = threading.Lock()
+        if archivo and os.path.exists(archivo):
+            with open(archivo, encoding='utf-8') as f:
+                self._entradas.update((clave, tuple(v)) for clave, v in json.load(f))
+    
+    def obtener(self, clave, calcular):
+        """Devuelve el resultado guardado o lo calcula y lo guarda"""
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > time.time():
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+        
+        # Se calcula fuera del bloqueo para no frenar otras peticiones
+        resultado = calcular()
+        with self._bloqueo:
+            self._entradas[clave] = (time.time() + self.ttl, resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+            if self.archivo:
+                self._guardar()
+        return resultado
+    
+    def _guardar(self):
+        """Escribe las entradas vigentes en el archivo (reemplazo atómico)"""
+        ahora = time.time()
+        vigentes = [[clave, v] for clave, v in self._entradas.items() if v[0] > ahora]
+        temporal = f'{self.archivo}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(vigentes, f)
+        os.replace(temporal, self.archivo)
+    
+    def estado(self):
+        """Contadores de uso del cache"""
+        with self._bloqueo:
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+def _proceso_vivo(pid):
+    """Si existe un proceso con ese pid en esta máquina (sin enviarle señales)"""
+    if os.name == 'nt':
+        # En Windows os.kill termina el proceso: se consulta su código de salida
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        proceso = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not proceso:
+            return False
+        codigo = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(proceso, ctypes.byref(codigo))
+        kernel32.CloseHandle(proceso)
+        return codigo.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class ColaTrabajos:
+    """Trabajos de estadisticas en segundo plano, persistidos en SQLite"""
+    def __init__(self, archivo, workers=2):
+        self.archivo = archivo
+        # Cada trabajo registra el proceso que lo corre; la base es la fuente de verdad
+        # del estado, así un DELETE atendido por otro proceso también lo detiene
+        self.propietario = f'{socket.gethostname()}:{os.getpid()}'
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='trabajo')
+        self._bloqueo = threading.Lock()
+        with self._conectar() as conexion:
+            conexion.execute('''CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY, parametros TEXT, estado TEXT, progreso REAL,
+                resultado TEXT, error TEXT, creado REAL, actualizado REAL, propietario TEXT)''')
+            columnas = {fila[1] for fila in conexion.execute('PRAGMA table_info(trabajos)')}
+            if 'propietario' not in columnas:
+                conexion.execute('ALTER TABLE trabajos ADD COLUMN propietario TEXT')
+            pendientes = conexion.execute(
+                "SELECT id, parametros, propietario FROM trabajos "
+                "WHERE estado IN ('pendiente', 'corriendo')"
+            ).fetchall()
+        # Trabajos cortados por un reinicio vuelven a la cola, pero solo si su proceso
+        # ya no existe; el UPDATE condicional evita que dos procesos tomen el mismo
+        for id_trabajo, parametros, propietario in pendientes:
+            if self._huerfano(propietario):
+                with self._conectar() as conexion:
+                    tomado = conexion.execute(
+                        "UPDATE trabajos SET estado = 'pendiente', propietario = ? "
+                        "WHERE id = ? AND propietario IS ? AND estado IN ('pendiente', 'corriendo')",
+                        (self.propietario, id_trabajo, propietario)
+                    ).rowcount
+                if tomado:
+                    self._pool.submit(self._correr, id_trabajo, json.loads(parametros))
+    
+    def _huerfano(self, propietario):
+        if not propietario:
+            return True
+        maquina, _, pid = propietario.rpartition(':')
+        if maquina != socket.gethostname():
+            return False  # de otra máquina: no se puede comprobar
+        # Al iniciar, un trabajo con nuestro pid viene de un proceso anterior
+        return int(pid) == os.getpid() or not _proceso_vivo(int(pid))
+    
+    def _conectar(self):
+        return sqlite3.connect(self.archivo, timeout=30)
+    
+    def _actualizar(self, id_trabajo, estados=None, **campos):
+        """Actualiza campos; con `estados`, solo si el trabajo sigue en uno de ellos"""
+        campos['actualizado'] = time.time()
+        asignaciones = ', '.join(f'{campo} = ?' for campo in campos)
+        condicion = 'id = ?'
+        if estados:
+            condicion += f" AND estado IN ({', '.join('?' * len(estados))})"
+        with self._conectar() as conexion:
+            return conexion.execute(f'UPDATE trabajos SET {asignaciones} WHERE {condicion}',
+                                    [*campos.values(), id_trabajo, *(estados or ())]).rowcount
+    
+    def enviar(self, parametros):
+        """Encola un trabajo; parámetros idénticos comparten el trabajo en curso.
+        
+        Un resultado terminado solo se reutiliza si hay semilla, igual que el cache.
+        """
+        id_trabajo = hashlib.sha1(json.dumps(parametros, sort_keys=True).encode()).hexdigest()[:16]
+        reutilizables = ('pendiente', 'corriendo')
+        if parametros.get('seed') is not None:
+            reutilizables += ('terminado',)
+        with self._bloqueo, self._conectar() as conexion:
+            fila = conexion.execute('SELECT estado FROM trabajos WHERE id = ?', (id_trabajo,)).fetchone()
+            if fila is not None and fila[0] in reutilizables:
+                return self.consultar(id_trabajo)
+            ahora = time.time()
+            conexion.execute(
+                'INSERT OR REPLACE INTO trabajos (id, parametros, estado, progreso, resultado, '
+                'error, creado, actualizado, propietario) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (id_trabajo, json.dumps(parametros), 'pendiente', 0.0,
+                 None, None, ahora, ahora, self.propietario))
+        self._pool.submit(self._correr, id_trabajo, parametros)
+        return self.consultar(id_trabajo)
+    
+    def _correr(self, id_trabajo, parametros):
+        # Si fue cancelado (o reemplazado) mientras esperaba, no se corre
+        if not self._actualizar(id_trabajo, ('pendiente',), estado='corriendo'):
+            return
+        try:
+            parcial = None
+            for parcial in sim.estadisticas_stream(**parametros):
+                # El progreso solo se escribe si sigue corriendo: si no, se canceló
+                if not self._actualizar(id_trabajo, ('corriendo',),
+                                        progreso=parcial['simulaciones'] / parcial['objetivo']):
+                    return
+            self._actualizar(id_trabajo, ('corriendo',), estado='terminado', progreso=1.0,
+                             resultado=json.dumps(parcial))
+        except Exception as error:
+            self._actualizar(id_trabajo, ('corriendo',), estado='error', error=str(error))
+    
+    def cancelar(self, id_trabajo):
+        """Marca el trabajo como cancelado; el proceso que lo corre se detiene en el próximo lote"""
+        self._actualizar(id_trabajo, ('pendiente', 'corriendo'), estado='cancelado')
+        return self.consultar(id_trabajo)
+    
+    def consultar(self, id_trabajo):
+        """Estado, progreso y resultado de un trabajo (None si no existe)"""
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                'SELECT id, parametros, estado, progreso, resultado, error, creado, actualizado '
+                'FROM trabajos WHERE id = ?', (id_trabajo,)
+            ).fetchone()
+        if fila is None:
+            return None
+        return {
+            'id': fila[0],
+            'parametros': json.loads(fila[1]),
+            'estado': fila[2],
+            'progreso': round(fila[3], 4),
+            'resultado': json.loads(fila[4]) if fila[4] else None,
+            'error': fila[5],
+            'creado': fila[6],
+            'actualizado': fila[7]
+        }
+
+def con_cache(endpoint, seed, calcular, **parametros):
+    """Usa el cache solo si la petición trae semilla explícita"""
+    if seed is None:
+        return calcular()
+    clave = json.dumps([endpoint, sorted(parametros.items()), seed])
+    return cache.obtener(clave, calcular)
+
+# Instancia global: solo reglas, sin estado por petición
 sim = CarameloSimulator()
+cache = CacheResultados(
+    max_entradas=int(os.environ.get('CARAMELOS_CACHE_ENTRADAS', 256)),
+    ttl=float(os.environ.get('CARAMELOS_CACHE_TTL', 3600)),
+    archivo=os.environ.get('CARAMELOS_CACHE_ARCHIVO')
+)
+
+# La cola se crea al primer uso: importar el módulo (tests, bench, procesos hijos)
+# no crea la base ni retoma trabajos
+_trabajos = None
+_bloqueo_trabajos = threading.Lock()
+
+def cola_trabajos():
+    """Cola de trabajos de este proceso"""
+    global _trabajos
+    with _bloqueo_trabajos:
+        if _trabajos is None:
+            _trabajos = ColaTrabajos(
+                os.environ.get('CARAMELOS_TRABAJOS_DB',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            'trabajos.sqlite3')),
+                workers=int(os.environ.get('CARAMELOS_TRABAJOS_WORKERS', 2))
+            )
+        return _trabajos
 
 @app.route('/')
 def index():
@@ -254,7 +1242,7 @@ def index():
             <div class="section">
                 <h2>📈 Análisis Estadístico</h2>
                 <div class="controls">
-                    <input type="number" id="simulaciones" value="1000" min="100" max="3000" placeholder="Simulaciones">
+                    <input type="number" id="simulaciones" value="1000" min="100" max="1000000" placeholder="Simulaciones">
                     <button class="btn btn-warning" onclick="calcularStats()">📊 Analizar</button>
                 </div>
                 <div id="loading" class="loading hidden">
@@ -267,6 +1255,8 @@ def index():
     </div>
 
     <script>
+        const UMBRAL_TRABAJO = __UMBRAL_TRABAJO__;
+        
         async function simularF1() {
             const jugadores = document.getElementById('jugadores-f1').value;
             const div = document.getElementById('resultado-f1');
@@ -328,66 +1318,352 @@ def index():
             }
         }
         
-        async function calcularStats() {
-            const simulaciones = document.getElementById('simulaciones').value;
-            const div = document.getElementById('estadisticas');
-            const loading = document.getElementById('loading');
-            
-            loading.classList.remove('hidden');
-            div.classList.add('hidden');
-            
+        function mostrarStats(div, data) {
+            div.innerHTML = `
+                <h3>📊 Análisis Estadístico (${data.simulaciones} simulaciones${data.terminado ? '' : '...'})</h3>
+                <div class="stats-grid">
+                    <div class="stat-card">
+                        <h4>📈 Fase 1 (Cooperación)</h4>
+                        <p><strong>Promedio:</strong> ${data.fase1.promedio}</p>
+                        <p><strong>Rango:</strong> ${data.fase1.min} - ${data.fase1.max}</p>
+                        <p><strong>Desv. Est.:</strong> ${data.fase1.std}</p>
+                    </div>
+                    <div class="stat-card">
+                        <h4>🏆 Fase 2 (Competencia)</h4>
+                        <p><strong>Promedio:</strong> ${data.fase2.promedio}</p>
+                        <p><strong>Rango:</strong> ${data.fase2.min} - ${data.fase2.max}</p>
+                        <p><strong>Desv. Est.:</strong> ${data.fase2.std}</p>
+                    </div>
+                </div>
+                <p><strong>💡 Insight:</strong> La Fase 2 genera más chupetines debido a los intercambios iterativos, demostrando cómo la competencia puede ser más eficiente que la cooperación simple.</p>
+            `;
+            div.classList.remove('hidden');
+        }
+        
+        async function calcularTrabajo(simulaciones, div, loading) {
+            const texto = loading.querySelector('p');
             try {
-                const response = await fetch(`/api/estadisticas?simulaciones=${simulaciones}`);
-                const data = await response.json();
+                const respuesta = await fetch(`/api/trabajos?simulaciones=${simulaciones}`, {method: 'POST'});
+                const trabajo = await respuesta.json();
                 
-                div.innerHTML = `
-                    <h3>📊 Análisis Estadístico (${data.simulaciones} simulaciones)</h3>
-                    <div class="stats-grid">
-                        <div class="stat-card">
-                            <h4>📈 Fase 1 (Cooperación)</h4>
-                            <p><strong>Promedio:</strong> ${data.fase1.promedio}</p>
-                            <p><strong>Rango:</strong> ${data.fase1.min} - ${data.fase1.max}</p>
-                            <p><strong>Desv. Est.:</strong> ${data.fase1.std}</p>
-                        </div>
-                        <div class="stat-card">
-                            <h4>🏆 Fase 2 (Competencia)</h4>
-                            <p><strong>Promedio:</strong> ${data.fase2.promedio}</p>
-                            <p><strong>Rango:</strong> ${data.fase2.min} - ${data.fase2.max}</p>
-                            <p><strong>Desv. Est.:</strong> ${data.fase2.std}</p>
-                        </div>
-                    </div>
-                    <p><strong>💡 Insight:</strong> La Fase 2 genera más chupetines debido a los intercambios iterativos, demostrando cómo la competencia puede ser más eficiente que la cooperación simple.</p>
-                `;
-                div.classList.remove('hidden');
+                // Consultar el progreso hasta que el trabajo termine
+                while (true) {
+                    const data = await (await fetch(`/api/trabajos/${trabajo.id}`)).json();
+                    if (data.estado === 'terminado') {
+                        mostrarStats(div, data.resultado);
+                        break;
+                    }
+                    if (data.estado === 'error' || data.estado === 'cancelado') {
+                        throw new Error(data.error || data.estado);
+                    }
+                    texto.textContent = `Calculando... ${Math.round(data.progreso * 100)}%`;
+                    await new Promise(resolver => setTimeout(resolver, 1000));
+                }
             } catch (error) {
                 div.innerHTML = '<p style="color: red;">Error al calcular estadísticas</p>';
                 div.classList.remove('hidden');
             } finally {
                 loading.classList.add('hidden');
+                texto.textContent = 'Calculando...';
+            }
+        }
+        
+        function calcularStats() {
+            const simulaciones = document.getElementById('simulaciones').value;
+            const div = document.getElementById('estadisticas');
+            const loading = document.getElementById('loading');
+            
+            loading.classList.remove('hidden');
+            div.classList.add('hidden');
+            
+            // Corridas grandes: trabajo en segundo plano en vez de una conexión abierta
+            if (Number(simulaciones) >= UMBRAL_TRABAJO) {
+                calcularTrabajo(simulaciones, div, loading);
+                return;
             }
+            
+            // Resultados parciales por Server-Sent Events
+            const fuente = new EventSource(`/api/estadisticas/stream?simulaciones=${simulaciones}`);
+            fuente.onmessage = (evento) => {
+                const data = JSON.parse(evento.data);
+                loading.classList.add('hidden');
+                mostrarStats(div, data);
+                if (data.terminado) fuente.close();
+            };
+            fuente.onerror = () => {
+                fuente.close();
+                loading.classList.add('hidden');
+                if (div.classList.contains('hidden')) {
+                    div.innerHTML = '<p style="color: red;">Error al calcular estadísticas</p>';
+                    div.classList.remove('hidden');
+                }
+            };
         }
     </script>
 </body>
-</html>"""
+</html>""".replace('__UMBRAL_TRABAJO__', str(UMBRAL_TRABAJO))
+
+# Perfilado por petición (?perfil=1), solo si CARAMELOS_PERFIL=1
+app.config['PERFIL_PERMITIDO'] = os.environ.get('CARAMELOS_PERFIL') == '1'
+
+@app.before_request
+def iniciar_medicion():
+    g.inicio = time.perf_counter()
+    if app.config['PERFIL_PERMITIDO'] and request.args.get('perfil') == '1':
+        g.perfil = cProfile.Profile()
+        g.perfil.enable()
+
+@app.after_request
+def terminar_medicion(response):
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.disable()
+        if response.is_json:
+            salida = io.StringIO()
+            pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(25)
+            datos = response.get_json()
+            datos['perfil'] = salida.getvalue()
+            response.set_data(json.dumps(datos))
+    ruta = request.url_rule.rule if request.url_rule else 'desconocida'
+    metricas.observar('caramelos_ruta_segundos', time.perf_counter() - g.inicio, ruta=ruta)
+    return response
+
+def responder(datos):
+    """jsonify midiendo el costo de serializar"""
+    inicio = time.perf_counter()
+    respuesta = jsonify(datos)
+    metricas.observar('caramelos_fase_segundos', time.perf_counter() - inicio, fase='json')
+    return respuesta
+
+@app.route('/metrics')
+def metrics():
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/fase1')
 def api_fase1():
     jugadores = request.args.get('jugadores', 30, type=int)
-    sim.crear_jugadores(jugadores)
-    return jsonify(sim.simular_fase1())
+    seed = request.args.get('seed', None, type=int)
+    compacto = request.args.get('compacto', int(jugadores >= UMBRAL_COMPACTO), type=int)
+    if jugadores < 0:
+        return responder({'error': 'jugadores no puede ser negativo'}), 400
+    
+    def calcular():
+        rng = rng_peticion(seed)
+        if compacto:
+            return sim.simular_fase1_compacto(sim.crear_juego_compacto(jugadores, rng=rng))
+        return sim.simular_fase1(sim.crear_jugadores(jugadores, rng))
+    
+    return responder(con_cache('fase1', seed, calcular, jugadores=jugadores, compacto=compacto))
 
 @app.route('/api/fase2')
 def api_fase2():
     jugadores = request.args.get('jugadores', 30, type=int)
-    sim.crear_equipos(jugadores)
-    return jsonify(sim.simular_fase2())
+    por_equipo = request.args.get('por_equipo', 15, type=int)
+    max_iteraciones = request.args.get('max_iteraciones', sim.max_iteraciones, type=int)
+    seed = request.args.get('seed', None, type=int)
+    compacto = request.args.get('compacto', int(jugadores >= UMBRAL_COMPACTO), type=int)
+    pagina = request.args.get('pagina', 1, type=int)
+    por_pagina = request.args.get('por_pagina', 50, type=int)
+    if pagina < 1 or por_pagina < 1 or por_equipo < 1:
+        return responder({'error': 'pagina, por_pagina y por_equipo deben ser al menos 1'}), 400
+    if jugadores < 0:
+        return responder({'error': 'jugadores no puede ser negativo'}), 400
+    
+    # Paginado sin semilla: el servidor elige una y la devuelve, para que las demás
+    # páginas pidan la misma partida (53 bits: la semilla viaja como número JSON)
+    semilla_servidor = compacto and seed is None
+    if semilla_servidor:
+        seed = secrets.randbits(53)
+    
+    def calcular():
+        rng = rng_peticion(seed)
+        if compacto:
+            juego = sim.crear_juego_compacto(jugadores, por_equipo, rng)
+            resultado = sim.simular_fase2_compacto(juego, max_iteraciones, rng, pagina, por_pagina)
+            return dict(resultado, seed=seed) if resultado else resultado
+        equipos = sim.crear_equipos(jugadores, por_equipo, rng)
+        return sim.simular_fase2(equipos, max_iteraciones, rng)
+    
+    if semilla_servidor:
+        return responder(calcular())
+    return responder(con_cache('fase2', seed, calcular, jugadores=jugadores, por_equipo=por_equipo,
+                             max_iteraciones=max_iteraciones, compacto=compacto,
+                             pagina=pagina, por_pagina=por_pagina))
+
+@app.route('/api/fase2/exacta')
+def api_fase2_exacta():
+    jugadores = request.args.get('jugadores', 30, type=int)
+    por_equipo = request.args.get('por_equipo', 15, type=int)
+    max_iteraciones = request.args.get('max_iteraciones', sim.max_iteraciones, type=int)
+    if not (1 <= por_equipo <= MAX_EQUIPO_EXACTA and 1 <= jugadores <= MAX_JUGADORES_EXACTA
+            and max_iteraciones >= 0):
+        return responder({'error': f'por_equipo debe estar entre 1 y {MAX_EQUIPO_EXACTA}, '
+                                   f'jugadores entre 1 y {MAX_JUGADORES_EXACTA} '
+                                   'y max_iteraciones no ser negativo'}), 400
+    return responder(sim.fase2_exacta(jugadores, por_equipo, max_iteraciones))
 
 @app.route('/api/estadisticas')
 def api_estadisticas():
     simulaciones = request.args.get('simulaciones', 1000, type=int)
-    return jsonify(sim.estadisticas(simulaciones))
+    seed = request.args.get('seed', None, type=int)
+    workers = request.args.get('workers', 1, type=int)
+    # workers no entra en la clave: el resultado no depende de él
+    return responder(con_cache('estadisticas', seed,
+                             lambda: sim.estadisticas(simulaciones, seed, workers),
+                             simulaciones=simulaciones))
+
+def _lista(texto, convertir=int, separador=','):
+    """Convierte '10,100,1000' en [10, 100, 1000]"""
+    return [convertir(x) for x in texto.split(separador) if x.strip()]
+
+@app.route('/api/barrido')
+def api_barrido():
+    jugadores = request.args.get('jugadores', [30], type=_lista)
+    por_equipo = request.args.get('por_equipo', [15], type=_lista)
+    # Listas de tipos separadas por ';', por ejemplo huevito,limon,pera;a,b,c,d
+    tipos = request.args.get('tipos', None, type=lambda t: _lista(t, lambda x: x.split(','), ';'))
+    costos = request.args.get('costo', None, type=_lista)
+    simulaciones = request.args.get('simulaciones', 200, type=int)
+    seed = request.args.get('seed', None, type=int)
+    if (not jugadores or not por_equipo or min(jugadores) < 1 or min(por_equipo) < 1
+            or (costos is not None and (not costos or min(costos) < 1))
+            or (tipos is not None and not all(0 < len(lista) <= 255 for lista in tipos))
+            or simulaciones < 1):
+        return responder({'error': 'jugadores, por_equipo, costo y simulaciones deben ser listas '
+                                   'o valores enteros positivos, y cada lista de tipos tener '
+                                   'entre 1 y 255 tipos'}), 400
+    if celdas_barrido(jugadores, por_equipo, tipos or [sim.tipos], costos or [sim.costo],
+                      simulaciones) > MAX_CELDAS_BARRIDO:
+        return responder({'error': f'La grilla supera {MAX_CELDAS_BARRIDO} celdas de trabajo '
+                                   '(simulaciones × (jugadores + equipos) × tipos)'}), 400
+    return responder(con_cache('barrido', seed,
+                             lambda: sim.barrido(jugadores, por_equipo, tipos, costos, simulaciones, seed),
+                             jugadores=jugadores, por_equipo=por_equipo, tipos=tipos,
+                             costos=costos, simulaciones=simulaciones))
+
+class _Tuberia(io.RawIOBase):
+    """Destino de escritura no buscable que acumula bytes para un generador"""
+    def __init__(self):
+        self.partes = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+    
+    def vaciar(self):
+        datos, self.partes = b''.join(self.partes), []
+        return datos
+
+def _npz_resultados(simulaciones, jugadores, por_equipo, seed):
+    """.npz sin compresión que se envía a medida que terminan los shards"""
+    metadatos = sim.metadatos_exportacion(simulaciones, jugadores, por_equipo, seed)
+    n_equipos = len(metadatos['equipo_jugadores'])
+    dtype = np.dtype(sim.tipo_chupetines())
+    tuberia = _Tuberia()
+    directorio, chicas = None, {}
+    try:
+        # Las columnas por corrida se juntan en disco temporal; la matriz por equipo,
+        # que es la grande, sale directo al zip shard a shard
+        directorio = tempfile.mkdtemp(prefix='caramelos_')
+        chicas = {
+            nombre: np.lib.format.open_memmap(os.path.join(directorio, f'{nombre}.npy'),
+                                              mode='w+', dtype=np.int32, shape=(simulaciones,))
+            for nombre in ('fase1_chupetines', 'fase2_max_chupetines')
+        }
+        with zipfile.ZipFile(tuberia, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            with zf.open('equipo_chupetines.npy', 'w', force_zip64=True) as destino:
+                np.lib.format.write_array_header_1_0(destino, {
+                    'descr': np.lib.format.dtype_to_descr(dtype),
+                    'fortran_order': False,
+                    'shape': (simulaciones, n_equipos)
+                })
+                yield tuberia.vaciar()
+                for inicio, f1, equipos in sim.resultados_por_shard(simulaciones, jugadores,
+                                                                    por_equipo, seed):
+                    destino.write(equipos.astype(dtype).tobytes())
+                    chicas['fase1_chupetines'][inicio:inicio + len(f1)] = f1
+                    chicas['fase2_max_chupetines'][inicio:inicio + len(f1)] = equipos.max(axis=1)
+                    yield tuberia.vaciar()
+            for nombre, arreglo in chicas.items():
+                arreglo.flush()
+                with open(os.path.join(directorio, f'{nombre}.npy'), 'rb') as origen, \
+                        zf.open(f'{nombre}.npy', 'w', force_zip64=True) as destino:
+                    while bloque := origen.read(1 << 20):
+                        destino.write(bloque)
+                        yield tuberia.vaciar()
+            zf.writestr('metadatos.json', json.dumps(metadatos))
+        yield tuberia.vaciar()
+    finally:
+        # También si el cliente corta, si falla la simulación o si nunca se leyó
+        chicas.clear()
+        if directorio is not None:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+@app.route('/api/exportar')
+def api_exportar():
+    simulaciones = request.args.get('simulaciones', 1000, type=int)
+    jugadores = request.args.get('jugadores', 30, type=int)
+    por_equipo = request.args.get('por_equipo', 15, type=int)
+    seed = request.args.get('seed', None, type=int)
+    if simulaciones < 1 or jugadores < 1 or por_equipo < 1:
+        return responder({'error': 'simulaciones, jugadores y por_equipo deben ser positivos'}), 400
+    # Nada se crea hasta que se empieza a leer la respuesta (un HEAD no deja temporales)
+    return Response(_npz_resultados(simulaciones, jugadores, por_equipo, seed),
+                    mimetype='application/zip', headers={
+                        'Content-Disposition': f'attachment; filename=caramelos_{simulaciones}.npz'
+                    })
+
+@app.route('/api/trabajos', methods=['POST'])
+def api_trabajos_enviar():
+    datos = request.get_json(silent=True) or request.values
+    try:
+        parametros = {
+            'simulaciones': int(datos.get('simulaciones', 1000)),
+            'seed': int(datos['seed']) if datos.get('seed') is not None else None,
+            'ancho_ic': float(datos['ancho_ic']) if datos.get('ancho_ic') is not None else None
+        }
+    except (TypeError, ValueError):
+        return responder({'error': 'simulaciones y seed deben ser enteros y ancho_ic un número'}), 400
+    if parametros['simulaciones'] < 1 or (parametros['ancho_ic'] is not None
+                                          and not parametros['ancho_ic'] > 0):
+        return responder({'error': 'simulaciones debe ser al menos 1 y ancho_ic positivo'}), 400
+    return responder(cola_trabajos().enviar(parametros)), 202
+
+@app.route('/api/trabajos/<id_trabajo>', methods=['GET', 'DELETE'])
+def api_trabajo(id_trabajo):
+    if request.method == 'DELETE':
+        trabajo = cola_trabajos().cancelar(id_trabajo)
+    else:
+        trabajo = cola_trabajos().consultar(id_trabajo)
+    if trabajo is None:
+        return responder({'error': 'Trabajo no encontrado'}), 404
+    return responder(trabajo)
+
+@app.route('/api/cache')
+def api_cache():
+    return responder(cache.estado())
+
+@app.route('/api/estadisticas/stream')
+def api_estadisticas_stream():
+    simulaciones = request.args.get('simulaciones', 1000, type=int)
+    seed = request.args.get('seed', None, type=int)
+    ancho_ic = request.args.get('ancho_ic', None, type=float)
+    
+    def eventos():
+        for parcial in sim.estadisticas_stream(simulaciones, seed, ancho_ic):
+            yield f'data: {json.dumps(parcial)}\n\n'
+    
+    return Response(eventos(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
 if __name__ == '__main__':
     print("🍬 Simulador optimizado iniciado!")
     print("📱 http://127.0.0.1:5000")
-    app.run(debug=True)
\ No newline at end of file
+    # Con debug=True el recargador relanza el script; solo el proceso que atiende
+    # peticiones retoma los trabajos pendientes
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        cola_trabajos()
+    app.run(debug=True, threaded=True)
\ No newline at end of file
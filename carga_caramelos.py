@@ -0,0 +1,79 @@
+"""Prueba de carga del simulador: peticiones/s y latencia p99 por concurrencia.
+
+Uso:
+    python carga_caramelos.py                      # levanta el servidor en un hilo
+    python carga_caramelos.py --url http://127.0.0.1:5000 --concurrencias 1,4,16,64
+"""
+import argparse
+import logging
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RUTAS = {
+    'fase1': '/api/fase1?jugadores=30',
+    'fase2': '/api/fase2?jugadores=30',
+    'estadisticas': '/api/estadisticas?simulaciones=1000',
+}
+
+
+def levantar_servidor():
+    """Sirve la app en un hilo (servidor con hilos) y devuelve su URL"""
+    from werkzeug.serving import make_server
+    from caramelos import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{servidor.server_port}', servidor
+
+
+def pedir(url):
+    """Hace una petición y devuelve su latencia en segundos"""
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(url) as respuesta:
+        respuesta.read()
+    return time.perf_counter() - inicio
+
+
+def medir(url, concurrencia, peticiones):
+    """Lanza `peticiones` llamadas con `concurrencia` clientes simultáneos"""
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        inicio = time.perf_counter()
+        latencias = np.array(list(pool.map(pedir, [url] * peticiones)))
+        total = time.perf_counter() - inicio
+    return {
+        'rps': peticiones / total,
+        'p50_ms': np.percentile(latencias, 50) * 1000,
+        'p99_ms': np.percentile(latencias, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='URL base de un servidor ya levantado')
+    parser.add_argument('--concurrencias', default='1,2,4,8,16')
+    parser.add_argument('--peticiones', type=int, default=200)
+    parser.add_argument('--rutas', default=','.join(RUTAS))
+    args = parser.parse_args()
+
+    servidor = None
+    base = args.url
+    if base is None:
+        base, servidor = levantar_servidor()
+
+    print(f"{'ruta':<14}{'conc.':>6}{'pet/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for ruta in args.rutas.split(','):
+        for concurrencia in map(int, args.concurrencias.split(',')):
+            r = medir(base + RUTAS[ruta], concurrencia, args.peticiones)
+            print(f"{ruta:<14}{concurrencia:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+    if servidor is not None:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()